@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# benchmark_vit_captioner.py - Compare captioning latency and caption agreement across precision modes
+
+import os
+import argparse
+import difflib
+import traceback
+import time
+import warnings
+
+# Filter out transformer warnings
+warnings.filterwarnings("ignore", message="Some weights of the model checkpoint.*")
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def load_images(image_inputs=None, video_path=None, num_frames=16):
+    """
+    Load the benchmark images
+
+    Args:
+        image_inputs: List of image files or directories of images
+        video_path: Video to sample frames from when no images are given
+        num_frames: Number of frames to sample from the video
+
+    Returns:
+        images: List of RGB PIL Images
+    """
+    from PIL import Image
+
+    images = []
+    for item in image_inputs or []:
+        if os.path.isdir(item):
+            paths = sorted(os.path.join(item, f) for f in os.listdir(item) if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths = [item]
+        images.extend(Image.open(path).convert("RGB") for path in paths)
+
+    if not images and video_path:
+        import cv2
+        from vit_captioner.utils.decoder import open_video
+        with open_video(video_path) as decoder:
+            for i in range(num_frames):
+                decoder.seek(int(i * decoder.frame_count / num_frames))
+                ret, frame = decoder.read()
+                if ret:
+                    images.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+    return images
+
+def benchmark_precision(images, precision, model_name, batch_size=8, repeat=3, decoding="beam"):
+    """
+    Caption the images in one precision mode and time it
+
+    Args:
+        images: List of RGB PIL Images
+        precision: fp32, int8 or bf16
+        model_name: Model to benchmark
+        batch_size: Number of images per generate call
+        repeat: Number of timed runs (the best one is reported)
+        decoding: beam, greedy or adaptive
+
+    Returns:
+        result: Dictionary with load time, latency, throughput and captions
+    """
+    from vit_captioner.captioning.image import ImageCaptioner
+
+    start_time = time.time()
+    captioner = ImageCaptioner(model_name, precision=precision, decoding=decoding)
+    load_time = time.time() - start_time
+
+    # Warm up so one-time allocations are not timed
+    captioner.predict_captions(images[:batch_size], batch_size=batch_size)
+
+    times = []
+    for _ in range(max(1, repeat)):
+        start_time = time.time()
+        captions = captioner.predict_captions(images, batch_size=batch_size)
+        times.append(time.time() - start_time)
+
+    best_time = min(times)
+    captioner.release()
+    return {
+        "precision": precision,
+        "load_time": load_time,
+        "latency_ms": 1000 * best_time / len(images),
+        "images_per_second": len(images) / best_time,
+        "captions": captions
+    }
+
+def caption_agreement(reference, captions):
+    """
+    Compare captions against the fp32 reference
+
+    Returns:
+        (exact, similarity): fraction of identical captions and mean word-level similarity
+    """
+    exact = sum(1 for a, b in zip(reference, captions) if a == b) / len(reference)
+    similarity = sum(difflib.SequenceMatcher(None, a.split(), b.split()).ratio()
+                     for a, b in zip(reference, captions)) / len(reference)
+    return exact, similarity
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vit-captioner precision modes")
+    parser.add_argument("-I", "--images", type=str, nargs="+", default=None,
+                        help="Image files or directories of images to caption")
+    parser.add_argument("-V", "--video", type=str, default="data/pork.mp4",
+                        help="Video to sample frames from when no images are given (default: data/pork.mp4)")
+    parser.add_argument("-N", "--num-frames", type=int, default=16,
+                        help="Number of video frames to sample (default: 16)")
+    parser.add_argument("-B", "--batch-size", type=int, default=8, help="Images per generate call (default: 8)")
+    parser.add_argument("-R", "--repeat", type=int, default=3, help="Number of timed runs per mode (default: 3)")
+    parser.add_argument("--precisions", type=str, nargs="+", default=["fp32", "int8", "bf16"],
+                        choices=["fp32", "int8", "bf16"], help="Precision modes to benchmark")
+    parser.add_argument("--decoding", choices=["beam", "greedy", "adaptive"], default="beam",
+                        help="Caption decoding of the benchmarked modes; the fp32 reference always uses beam search")
+    parser.add_argument("--model", type=str, default="nlpconnect/vit-gpt2-image-captioning",
+                        help="Model name or local path")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print the captions of every mode")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.video, args.num_frames)
+    if not images:
+        print("No images to benchmark.")
+        return 1
+    print(f"Benchmarking {len(images)} images, batch size {args.batch_size}")
+
+    # fp32 beam search is always run first as the reference
+    modes = [("fp32", "beam")] + [(p, args.decoding) for p in args.precisions if (p, args.decoding) != ("fp32", "beam")]
+    results = []
+    for precision, decoding in modes:
+        name = precision if decoding == "beam" else f"{precision}/{decoding}"
+        try:
+            print(f"\nRunning {name}...")
+            result = benchmark_precision(images, precision, args.model, args.batch_size, args.repeat, decoding)
+            results.append(dict(result, mode=name))
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error benchmarking {name}: {str(e)}")
+
+    if not results or results[0]["mode"] != "fp32":
+        print("\nfp32 reference run failed, cannot compare precision modes")
+        return 1
+
+    reference = results[0]
+    print("\n===== BENCHMARK SUMMARY =====")
+    print(f"{'mode':<14} {'load s':>8} {'ms/image':>10} {'images/s':>10} {'speedup':>8} {'exact':>7} {'similar':>8}")
+    for result in results:
+        exact, similarity = caption_agreement(reference["captions"], result["captions"])
+        speedup = reference["latency_ms"] / result["latency_ms"]
+        print(f"{result['mode']:<14} {result['load_time']:>8.2f} {result['latency_ms']:>10.1f} "
+              f"{result['images_per_second']:>10.2f} {speedup:>7.2f}x {exact:>7.0%} {similarity:>8.0%}")
+
+    if args.verbose:
+        for i in range(len(images)):
+            print(f"\nImage {i}:")
+            for result in results:
+                print(f"  {result['mode']:<14} {result['captions'][i]}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
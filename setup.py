@@ -38,8 +38,15 @@ setup(
         "Pillow",
         "matplotlib",
         "tqdm",
-        "Katna",
     ],
+    extras_require={
+        # Optional Katna keyframe backend (extract --backend katna)
+        "katna": ["Katna"],
+        # Optional onnxruntime captioning backend (export-onnx, --onnx)
+        "onnx": ["onnx", "onnxruntime", "tokenizers"],
+        # Optional PyAV video decoder (--decoder pyav)
+        "pyav": ["av"],
+    },
     entry_points={
         "console_scripts": [
             "vit-captioner=vit_captioner.cli:main",
@@ -2,7 +2,10 @@
 # test_vit_captioner_enhanced.py - Enhanced test script for vit-captioner with performance metrics
 
 import os
+import sys
+import json
 import argparse
+import subprocess
 import traceback
 import datetime
 import time
@@ -138,6 +141,571 @@ def test_python_api(video_path="data/pork.mp4", num_frames=5, verbose=True):
         print(f"Error: {str(e)}")
         return False, 0, {}
 
+def test_startup_time(max_seconds=2.0):
+    """
+    Check that importing the package and the CLI does not load heavy dependencies
+    
+    Args:
+        max_seconds: Maximum allowed time for `vit-captioner --help`
+        
+    Returns:
+        success: Boolean indicating success, startup time
+    """
+    print("\nTesting vit-captioner startup time...")
+    
+    # Import in a fresh interpreter and report which heavy modules got loaded
+    code = (
+        "import sys, json\n"
+        "import vit_captioner, vit_captioner.cli, vit_captioner.keyframes\n"
+        "heavy = ['torch', 'transformers', 'Katna', 'matplotlib']\n"
+        "print(json.dumps([m for m in heavy if m in sys.modules]))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    loaded = json.loads(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+    
+    start_time = time.time()
+    help_result = subprocess.run([sys.executable, "-m", "vit_captioner.cli", "--help"], capture_output=True, text=True)
+    startup_time = time.time() - start_time
+    
+    if loaded is None or help_result.returncode != 0:
+        print(f"Startup test FAILED! Could not import vit_captioner:\n{result.stderr or help_result.stderr}")
+        return False, startup_time
+    if loaded:
+        print(f"Startup test FAILED! Importing the CLI loaded: {', '.join(loaded)}")
+        return False, startup_time
+    if startup_time > max_seconds:
+        print(f"Startup test FAILED! --help took {startup_time:.2f} seconds (limit: {max_seconds:.2f})")
+        return False, startup_time
+    
+    print(f"Startup test PASSED! --help took {startup_time:.2f} seconds")
+    return True, startup_time
+
+def make_test_video(video_path, num_frames=90, fps=30, size=(160, 90)):
+    """
+    Write a small synthetic video where every frame is different
+    
+    Each second uses its own random background and a white square moves
+    across it, so frames can be told apart exactly.
+    
+    Args:
+        video_path: Path of the .mp4 file to write
+        num_frames: Number of frames
+        fps: Frame rate
+        size: (width, height) of the frames
+        
+    Returns:
+        frames: List of the BGR frames that were written
+    """
+    import cv2
+    import numpy as np
+    
+    width, height = size
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    frames = []
+    for i in range(num_frames):
+        rng = np.random.RandomState(i // fps)
+        background = cv2.resize(rng.randint(0, 256, (9, 16, 3)).astype(np.uint8), size, interpolation=cv2.INTER_LINEAR)
+        frame = background.copy()
+        x = (i * 5) % (width - 20)
+        frame[height // 2 - 10:height // 2 + 10, x:x + 20] = 255
+        writer.write(frame)
+        frames.append(frame)
+    writer.release()
+    return frames
+
+def save_keyframes(video_path, keyframes_folder, frame_indices):
+    """Save decoded frames of a video as .jpeg keyframes named after their frame index"""
+    import cv2
+    
+    os.makedirs(keyframes_folder, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index in frame_indices:
+            cv2.imwrite(os.path.join(keyframes_folder, f"k{index:03d}.jpeg"), frame)
+        index += 1
+    cap.release()
+
+def test_keyframe_matching(work_dir):
+    """
+    Check that vectorized keyframe matching finds the exact frame of each keyframe
+    
+    Args:
+        work_dir: Directory for the synthetic video and keyframes
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting vectorized keyframe matching...")
+    start_time = time.time()
+    try:
+        from vit_captioner.keyframes.matcher import VideoKeyframeMatcher
+        
+        video_path = os.path.join(work_dir, "match.mp4")
+        keyframes_folder = os.path.join(work_dir, "match_keyframes")
+        make_test_video(video_path)
+        expected = [7, 44, 81]
+        save_keyframes(video_path, keyframes_folder, expected)
+        keyframe_paths = [os.path.join(keyframes_folder, f"k{index:03d}.jpeg") for index in expected]
+        keyframe_paths.append(os.path.join(keyframes_folder, "missing.jpeg"))
+        
+        # Stream the video in small chunks, then compare with the in-memory path
+        matcher = VideoKeyframeMatcher(video_path, keyframes_folder, chunk_size=16)
+        streamed = matcher.match_keyframes(keyframe_paths)
+        matcher.load_video_to_array()
+        in_memory = matcher.match_keyframes(keyframe_paths)
+        
+        found = [int(round(best_time * matcher.fps)) for _, best_time, _ in streamed[:-1]]
+        failures = []
+        if found != expected:
+            failures.append(f"matched frames {found}, expected {expected}")
+        if streamed[-1][1:] != (-1, -1):
+            failures.append(f"missing keyframe returned {streamed[-1][1:]}")
+        if [r[1] for r in streamed] != [r[1] for r in in_memory]:
+            failures.append("streaming and in-memory matching disagree")
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"Keyframe matching test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"Keyframe matching test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+def test_frame_sampler(work_dir):
+    """
+    Check that both sampling strategies yield exactly the requested frames
+    
+    A decoder over a list of numbered frames, with some frames that fail to
+    decode, checks the indices; the synthetic video checks that seeking and
+    walking the stream return the same pixels.
+    
+    Args:
+        work_dir: Directory for the synthetic video
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting frame sampling strategies...")
+    start_time = time.time()
+    try:
+        import numpy as np
+        from vit_captioner.utils.decoder import VideoDecoder, open_video
+        from vit_captioner.utils.sampling import FrameSampler, SEQUENTIAL, SEEK
+        
+        class NumberedDecoder(VideoDecoder):
+            """Decoder whose frames are their own indices, failing on the indices in bad"""
+            def __init__(self, frame_count, bad=()):
+                super().__init__()
+                self.frame_count = frame_count
+                self.bad = set(bad)
+                self.next_index = 0
+            def _grab(self):
+                index, self.next_index = self.next_index, self.next_index + 1
+                self.grabbed = index
+                return index < self.frame_count and index not in self.bad
+            def _retrieve(self):
+                return True, self.grabbed
+            def _seek(self, index):
+                self.next_index = index
+        
+        failures = []
+        requested = [80, 10, 10, 30, 31, 55, 200, 260]
+        for strategy in (SEQUENTIAL, SEEK):
+            sampler = FrameSampler(NumberedDecoder(300, bad=(30, 55, 150)), strategy=strategy, seek_threshold=40)
+            sampled = list(sampler.sample(requested))
+            expected = [10, 10, 31, 80, 200, 260]
+            if [index for index, _ in sampled] != expected or any(index != frame for index, frame in sampled):
+                failures.append(f"{strategy} sampling yielded {sampled}, expected {expected}")
+        
+        video_path = os.path.join(work_dir, "sampler.mp4")
+        make_test_video(video_path)
+        indices = [0, 12, 12, 47, 89]
+        frames = {}
+        for strategy in (SEQUENTIAL, SEEK):
+            with open_video(video_path) as decoder:
+                frames[strategy] = list(FrameSampler(decoder, strategy=strategy, seek_threshold=1).sample(indices))
+        if [index for index, _ in frames[SEEK]] != indices:
+            failures.append(f"seek sampling on a video yielded {[index for index, _ in frames[SEEK]]}")
+        for (index, walked), (_, sought) in zip(frames[SEQUENTIAL], frames[SEEK]):
+            if np.abs(walked.astype(int) - sought.astype(int)).mean() > 2:
+                failures.append(f"frame {index} differs between sequential and seek sampling")
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"Frame sampler test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"Frame sampler test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+def test_dedup_grouping(work_dir):
+    """
+    Check that near-duplicate frames share a group and different shots do not
+    
+    Every shot is the same gradient tinted a different colour, so the shots
+    differ in colour rather than in structure; each shot has three noisy
+    copies, and the first shot comes back at the end.
+    
+    Args:
+        work_dir: Unused, the frames are generated in memory
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting near-duplicate frame grouping...")
+    start_time = time.time()
+    try:
+        import numpy as np
+        from vit_captioner.captioning.dedup import FrameDeduplicator
+        
+        rng = np.random.RandomState(0)
+        gradient = np.tile(np.linspace(0.2, 1.0, 160), (120, 1))[:, :, None]
+        tints = [(255, 40, 40), (40, 255, 40), (40, 40, 255), (255, 255, 40), (255, 40, 255), (40, 255, 255), (255, 40, 40)]
+        frames, expected = [], []
+        for shot, tint in enumerate(tints):
+            for _ in range(3):
+                noisy = gradient * np.array(tint) + rng.normal(0, 3, (120, 160, 3))
+                frames.append(np.clip(noisy, 0, 255).astype(np.uint8))
+                expected.append(shot)
+        
+        deduplicator = FrameDeduplicator()
+        groups = []
+        for frame in frames:
+            group_id, is_new = deduplicator.assign(frame)
+            if is_new:
+                deduplicator.set_caption(group_id, f"shot {group_id}")
+            groups.append(group_id)
+        
+        failures = []
+        if groups != expected:
+            failures.append(f"groups {groups}, expected {expected}")
+        if deduplicator.caption(groups[-1]) != f"shot {len(tints) - 1}":
+            failures.append("the returning first shot reused the caption of an older group")
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"Dedup grouping test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"Dedup grouping test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+def test_caption_cache(work_dir):
+    """
+    Check caption cache hits, misses, persistence and LRU eviction
+    
+    Args:
+        work_dir: Directory for the SQLite cache file
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting the caption cache...")
+    start_time = time.time()
+    try:
+        import numpy as np
+        from PIL import Image
+        from vit_captioner.captioning.cache import CaptionCache, caption_key, image_digest
+        
+        failures = []
+        pixels = np.random.RandomState(0).randint(0, 256, (32, 32, 3)).astype(np.uint8)
+        digest = image_digest(Image.fromarray(pixels))
+        if image_digest(Image.fromarray(pixels.copy())) != digest:
+            failures.append("the same pixels gave different digests")
+        greedy = caption_key(digest, "model", {"num_beams": 1})
+        if caption_key(digest, "model", {"num_beams": 4}) == greedy or caption_key(digest, "other", {"num_beams": 1}) == greedy:
+            failures.append("the key does not depend on the model and generation settings")
+        
+        keys = [caption_key(f"digest {i}", "model", {}) for i in range(4)]
+        cache = CaptionCache(os.path.join(work_dir, "captions.sqlite"), max_bytes=3 * (64 + 9 + 64) + 10)
+        if cache.get(keys[0]) is not None:
+            failures.append("an empty cache returned a caption")
+        for i, key in enumerate(keys[:3]):
+            cache.put(key, f"caption {i}")
+            time.sleep(0.01)
+        if cache.get(keys[0]) != "caption 0":
+            failures.append("a stored caption was not returned")
+        time.sleep(0.01)
+        # keys[1] is now the least recently used entry and has to make room for keys[3]
+        cache.put(keys[3], "caption 3")
+        found = cache.get_many(keys)
+        if sorted(found) != sorted([keys[0], keys[2], keys[3]]):
+            failures.append(f"after eviction the cache holds {[keys.index(key) for key in found]}, expected [0, 2, 3]")
+        if cache.size() > cache.max_bytes:
+            failures.append(f"cache size {cache.size()} exceeds max_bytes {cache.max_bytes}")
+        cache.close()
+        
+        reopened = CaptionCache(**cache.options())
+        if reopened.get(keys[3]) != "caption 3" or reopened.max_bytes != cache.max_bytes:
+            failures.append("captions or the size limit were lost after reopening the cache")
+        reopened.close()
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"Caption cache test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"Caption cache test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+def make_tiny_caption_model(model_dir):
+    """
+    Save a small randomly initialised ViT-GPT2 captioning model
+    
+    It has the same architecture as the default model, so it exercises the
+    same code paths without downloading anything.
+    
+    Args:
+        model_dir: Directory to save the model, image processor and tokenizer to
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import (ViTConfig, GPT2Config, VisionEncoderDecoderConfig, VisionEncoderDecoderModel,
+                              ViTImageProcessor, PreTrainedTokenizerFast)
+    
+    torch.manual_seed(0)
+    words = ["<|endoftext|>", "a", "dog", "cat", "on", "the", "table", "man", "with", "plate"]
+    vocab = {word: i for i, word in enumerate(words + [f"w{i}" for i in range(54)])}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token=words[0]))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token=words[0], eos_token=words[0], unk_token=words[0])
+    
+    encoder = ViTConfig(hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64,
+                        image_size=224, patch_size=32)
+    decoder = GPT2Config(n_embd=32, n_layer=2, n_head=2, vocab_size=len(vocab), bos_token_id=0, eos_token_id=0,
+                         add_cross_attention=True, is_decoder=True)
+    model = VisionEncoderDecoderModel(VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder))
+    # Larger weights so captions depend on the image and vary in length
+    with torch.no_grad():
+        for parameter in model.parameters():
+            if parameter.dim() > 1:
+                parameter.normal_(0, 0.3)
+        model.decoder.transformer.wte.weight[0] *= 2.2
+    for config in (model.config, model.generation_config):
+        config.decoder_start_token_id = config.pad_token_id = config.eos_token_id = 0
+    
+    model.save_pretrained(model_dir)
+    ViTImageProcessor(size={"height": 224, "width": 224}).save_pretrained(model_dir)
+    tokenizer.save_pretrained(model_dir)
+
+def test_onnx_parity(work_dir):
+    """
+    Check that the ONNX Runtime backend gives the same captions as PyTorch
+    
+    A tiny random model is exported to ONNX and both backends caption the
+    same images with greedy and beam search decoding.
+    
+    Args:
+        work_dir: Directory for the tiny model and its ONNX export
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting ONNX Runtime parity with PyTorch...")
+    start_time = time.time()
+    try:
+        import importlib.util
+        missing = [name for name in ("onnx", "onnxruntime") if importlib.util.find_spec(name) is None]
+        if missing:
+            print(f"ONNX parity test SKIPPED! Not installed: {', '.join(missing)}")
+            return True, 0
+        
+        import numpy as np
+        from PIL import Image
+        from vit_captioner.captioning.image import ImageCaptioner
+        from vit_captioner.captioning.onnx_backend import OnnxImageCaptioner
+        from vit_captioner.captioning.onnx_export import export_onnx
+        
+        model_dir = os.path.join(work_dir, "tiny_model")
+        onnx_dir = os.path.join(work_dir, "tiny_onnx")
+        make_tiny_caption_model(model_dir)
+        failures = []
+        if export_onnx(onnx_dir, model_dir) is None:
+            failures.append("export failed")
+        else:
+            rng = np.random.RandomState(0)
+            images = [Image.fromarray((rng.rand(60, 80, 3) * 255).astype(np.uint8)) for _ in range(8)]
+            torch_captioner = ImageCaptioner(model_dir)
+            onnx_captioner = OnnxImageCaptioner(onnx_dir)
+            for gen_kwargs in ({"max_length": 16, "num_beams": 1}, {"max_length": 16, "num_beams": 4}):
+                expected = torch_captioner.predict_captions(images, gen_kwargs=gen_kwargs)
+                captions = onnx_captioner.predict_captions(images, gen_kwargs=gen_kwargs)
+                if captions != expected:
+                    failures.append(f"num_beams={gen_kwargs['num_beams']}: ONNX {captions} != PyTorch {expected}")
+                if len(set(expected)) < 2:
+                    failures.append(f"num_beams={gen_kwargs['num_beams']}: every image got the same caption")
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"ONNX parity test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"ONNX parity test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+def test_video_index(work_dir):
+    """
+    Check that an indexed video finds keyframes without decoding it again
+    
+    Args:
+        work_dir: Directory for the synthetic video, its keyframes and its index
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting the video index...")
+    start_time = time.time()
+    try:
+        import cv2
+        from vit_captioner.keyframes.index import VideoIndex, open_index
+        
+        video_path = os.path.join(work_dir, "index.mp4")
+        keyframes_folder = os.path.join(work_dir, "index_keyframes")
+        index_path = os.path.join(work_dir, "index.vidx")
+        make_test_video(video_path)
+        expected = [5, 37, 70]
+        save_keyframes(video_path, keyframes_folder, expected)
+        
+        failures = []
+        index = open_index(video_path, index_path, verbose=False)
+        if len(index) != 90:
+            failures.append(f"indexed {len(index)} frames, expected 90")
+        for frame_index in expected:
+            keyframe = cv2.imread(os.path.join(keyframes_folder, f"k{frame_index:03d}.jpeg"), cv2.IMREAD_GRAYSCALE)
+            found, correlation = index.lookup(keyframe)
+            if found != frame_index or correlation < 0.95:
+                failures.append(f"keyframe {frame_index} matched frame {found} (correlation {correlation:.3f})")
+        
+        # Re-encoding the video makes the index stale, and open_index rebuilds it
+        if not VideoIndex(index_path).is_valid(video_path):
+            failures.append("a freshly built index is not valid")
+        time.sleep(0.01)
+        make_test_video(video_path, num_frames=60)
+        if VideoIndex(index_path).is_valid(video_path):
+            failures.append("the index is still valid after the video changed")
+        if len(open_index(video_path, index_path, verbose=False)) != 60:
+            failures.append("open_index did not rebuild the stale index")
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"Video index test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"Video index test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+def test_batch_outputs(work_dir):
+    """
+    Check that batch captioning gives every input its own outputs
+    
+    Two videos share a name with different extensions, and a third has an
+    upper-case extension with the lowercase symlink an earlier run leaves
+    next to it. The videos are captioned with a tiny random model.
+    
+    Args:
+        work_dir: Directory for the videos, the tiny model and the outputs
+        
+    Returns:
+        success: Boolean indicating success, test time
+    """
+    print("\nTesting batch captioning outputs...")
+    start_time = time.time()
+    try:
+        from vit_captioner.captioning.batch import BatchVideoCaptioner, collect_videos
+        from vit_captioner.captioning.image import ImageCaptioner
+        
+        videos_dir = os.path.join(work_dir, "batch_videos")
+        os.makedirs(videos_dir)
+        for name, num_frames in (("Y.MP4", 30), ("x.avi", 45), ("x.mp4", 60)):
+            make_test_video(os.path.join(videos_dir, name), num_frames=num_frames)
+        os.symlink("Y.MP4", os.path.join(videos_dir, "Y.mp4"))
+        
+        failures = []
+        videos = collect_videos([videos_dir, os.path.join(videos_dir, "x.mp4"), os.path.join(videos_dir, "*.mp4")])
+        expected = [os.path.join(videos_dir, name) for name in ("Y.MP4", "x.avi", "x.mp4")]
+        if videos != expected:
+            failures.append(f"collected {videos}, expected {expected}")
+        
+        model_dir = os.path.join(work_dir, "batch_model")
+        make_tiny_caption_model(model_dir)
+        
+        class TinyModelBatchCaptioner(BatchVideoCaptioner):
+            def create_captioner(self):
+                return ImageCaptioner(model_dir)
+        
+        summary = TinyModelBatchCaptioner(expected, summary_path=os.path.join(work_dir, "batch_summary.json"),
+                                          num_frames=3).run()
+        srt_files = [entry.get("srt") for entry in summary]
+        if [entry["status"] for entry in summary] != ["ok"] * 3:
+            failures.append(f"statuses {[entry['status'] for entry in summary]}")
+        elif len(set(srt_files)) != 3 or not all(os.path.isfile(path) for path in srt_files):
+            failures.append(f"outputs are not one file per video: {srt_files}")
+        else:
+            stems = [os.path.basename(path).split("_caption_")[0] for path in srt_files]
+            if stems != ["Y", "x_avi", "x_mp4"]:
+                failures.append(f"output names start with {stems}, expected ['Y', 'x_avi', 'x_mp4']")
+            # The videos are 1, 1.5 and 2 seconds long, so each caption file ends at its own video's end
+            durations = []
+            for path in [entry["json"] for entry in summary]:
+                with open(path) as f:
+                    hours, minutes, seconds = json.load(f)[-1]["end"].replace(",", ".").split(":")
+                durations.append(round(int(hours) * 3600 + int(minutes) * 60 + float(seconds), 1))
+            if durations != [1.0, 1.5, 2.0]:
+                failures.append(f"caption files end at {durations} seconds, expected [1.0, 1.5, 2.0]")
+    except Exception as e:
+        traceback.print_exc()
+        failures = [str(e)]
+    elapsed = time.time() - start_time
+    
+    if failures:
+        print(f"Batch outputs test FAILED! {'; '.join(failures)}")
+        return False, elapsed
+    print(f"Batch outputs test PASSED! ({elapsed:.2f} seconds)")
+    return True, elapsed
+
+# Deterministic checks of individual components: (name, test function taking a work directory)
+COMPONENT_TESTS = [
+    ("Keyframe matching", test_keyframe_matching),
+    ("Frame sampler", test_frame_sampler),
+    ("Dedup grouping", test_dedup_grouping),
+    ("Caption cache", test_caption_cache),
+    ("ONNX parity", test_onnx_parity),
+    ("Video index", test_video_index),
+    ("Batch outputs", test_batch_outputs),
+]
+
+def test_components():
+    """
+    Run the component checks in a temporary directory
+    
+    Returns:
+        results: Dictionary mapping each check to {"success", "time"}
+    """
+    import tempfile
+    
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="vit_captioner_test_") as work_dir:
+        for name, test in COMPONENT_TESTS:
+            success, elapsed = test(work_dir)
+            results[name] = {"success": success, "time": elapsed}
+    return results
+
 def check_captions_quality(json_file):
     """
     Check the quality of generated captions
@@ -193,12 +761,27 @@ def main():
                        help="Number of frames to extract (default: 5)")
     parser.add_argument("--cli-only", action="store_true", help="Only test the command line interface")
     parser.add_argument("--api-only", action="store_true", help="Only test the Python API")
+    parser.add_argument("--startup-only", action="store_true", help="Only test the import and CLI startup time")
+    parser.add_argument("--components-only", action="store_true",
+                       help="Only run the startup test and the component checks (no model download needed)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
     args = parser.parse_args()
     
     results = {}
     success = True
     
+    startup_success, startup_time = test_startup_time()
+    results["startup"] = {
+        "success": startup_success,
+        "time": startup_time
+    }
+    success = success and startup_success
+    if not args.startup_only:
+        results["components"] = test_components()
+        success = success and all(result["success"] for result in results["components"].values())
+    if args.startup_only or args.components_only:
+        args.cli_only = args.api_only = True
+    
     if not args.api_only:
         cli_success, cli_time, cli_outputs = test_command_line(
             video_path=args.video, 
@@ -234,6 +817,12 @@ def main():
             results["api"]["quality"] = check_captions_quality(api_outputs["json_file"])
     
     print("\n===== TEST SUMMARY =====")
+    print(f"Startup Test: {'PASSED' if results['startup']['success'] else 'FAILED'}")
+    print(f"  Startup time: {results['startup']['time']:.2f} seconds")
+    
+    for name, result in results.get("components", {}).items():
+        print(f"{name} Test: {'PASSED' if result['success'] else 'FAILED'}")
+    
     if "cli" in results:
         print(f"CLI Test: {'PASSED' if results['cli']['success'] else 'FAILED'}")
         print(f"  Processing time: {results['cli']['time']:.2f} seconds")
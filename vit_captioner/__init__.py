@@ -7,15 +7,18 @@ __version__ = VERSION  # Import version from version.py
 
 # __version__ = "0.1.2"
 
-from .keyframes import KeyFrameExtractor, VideoKeyframeMatcher
-from .captioning import ImageCaptioner, VideoToCaption
-from .utils import visualize_keyframes, visualize_timeline
+from .utils.lazy import lazy_exports
 
-__all__ = [
-    'KeyFrameExtractor',
-    'VideoKeyframeMatcher',
-    'ImageCaptioner',
-    'VideoToCaption',
-    'visualize_keyframes',
-    'visualize_timeline'
-]
\ No newline at end of file
+_EXPORTS = {
+    'KeyFrameExtractor': '.keyframes.extractor',
+    'VideoKeyframeMatcher': '.keyframes.matcher',
+    'ImageCaptioner': '.captioning.image',
+    'VideoToCaption': '.captioning.video',
+    'visualize_keyframes': '.utils.visualization',
+    'visualize_timeline': '.utils.visualization',
+}
+
+__all__ = list(_EXPORTS)
+
+# Exports are imported on first access so importing the package stays cheap
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
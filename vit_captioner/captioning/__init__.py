@@ -2,7 +2,28 @@
 Captioning module for images and videos
 """
 
-from .image import ImageCaptioner
-from .video import VideoToCaption
+from ..utils.lazy import lazy_exports
 
-__all__ = ['ImageCaptioner', 'VideoToCaption']
\ No newline at end of file
+_EXPORTS = {
+    'ImageCaptioner': '.image',
+    'VideoToCaption': '.video',
+    'ModelRegistry': '.registry',
+    'warmup': '.registry',
+    'release': '.registry',
+    'CaptionCache': '.cache',
+    'EncoderCache': '.encoder_cache',
+    'ProcessCaptioningEngine': '.engine',
+    'BatchVideoCaptioner': '.batch',
+    'collect_videos': '.batch',
+    'DynamicBatcher': '.batcher',
+    'OnnxImageCaptioner': '.onnx_backend',
+    'export_onnx': '.onnx_export',
+    'create_captioner': '.base',
+    'CaptionedImageWriter': '.render',
+    'flush_writes': '.render',
+}
+
+__all__ = list(_EXPORTS)
+
+# Exports are imported on first access so importing the package stays cheap
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,249 @@
+"""
+captioning/base.py - Model-independent captioner logic shared by the PyTorch and ONNX backends
+"""
+
+import traceback
+import numpy as np
+from PIL import Image
+from .cache import CaptionCache, image_digest, caption_key
+from .render import get_writer, save_captioned_image
+from .constants import (DEFAULT_MODEL_NAME, FP32, BEAM, GREEDY, ADAPTIVE, DECODING_STRATEGIES,
+                        DEFAULT_CONFIDENCE_THRESHOLD, ERROR_CAPTION)
+
+
+def create_captioner(model_name=DEFAULT_MODEL_NAME, device=None, cache=None, precision=FP32, onnx_dir=None,
+                     num_threads=None, decoding=BEAM, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                     encoder_cache=None):
+    """
+    Create a PyTorch ImageCaptioner, or an OnnxImageCaptioner when onnx_dir is given.
+
+    The backend is imported here, so the ONNX path never loads torch. The
+    encoder output cache is only supported by the PyTorch backend.
+    """
+    if onnx_dir:
+        if encoder_cache:
+            print("The encoder cache is not supported by the ONNX backend; ignoring it")
+        from .onnx_backend import OnnxImageCaptioner
+        return OnnxImageCaptioner(onnx_dir, cache=cache, num_threads=num_threads, decoding=decoding,
+                                  confidence_threshold=confidence_threshold)
+    from .image import ImageCaptioner
+    return ImageCaptioner(model_name, device=device, cache=cache, encoder_cache=encoder_cache, precision=precision,
+                          decoding=decoding, confidence_threshold=confidence_threshold)
+
+
+class BaseCaptioner:
+    """
+    Image loading, batching, caption caching and captioned-image output.
+
+    Backends set model_name, cache_model_name, gen_kwargs and cache in their
+    constructor, call set_decoding(), and implement
+    generate_captions(pil_images, gen_kwargs) and
+    generate_greedy(pil_images, max_length). This module does not import
+    torch, so torch-free backends can use it.
+    """
+
+    def open_cache(self, cache):
+        """
+        Open the optional persistent caption cache: a CaptionCache, a path, True
+        for the default path, or CaptionCache keyword arguments
+        """
+        if cache is True:
+            return CaptionCache()
+        if isinstance(cache, str):
+            return CaptionCache(cache)
+        if isinstance(cache, dict):
+            return CaptionCache(**cache)
+        return cache
+
+    def set_decoding(self, decoding=BEAM, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+        """
+        Choose how captions are decoded when no explicit gen_kwargs are given.
+        
+        Args:
+            decoding: "beam" (self.gen_kwargs), "greedy", or "adaptive": greedy,
+                re-decoding with beam search the captions whose least likely
+                token has a probability below confidence_threshold
+            confidence_threshold: Escalation threshold of adaptive decoding
+        """
+        if decoding not in DECODING_STRATEGIES:
+            raise ValueError(f"Unknown decoding {decoding!r}, expected one of {', '.join(DECODING_STRATEGIES)}")
+        self.decoding = decoding
+        self.confidence_threshold = confidence_threshold
+
+    def greedy_kwargs(self):
+        """Generation settings of greedy decoding"""
+        return {"max_length": self.gen_kwargs.get("max_length", 16), "num_beams": 1}
+
+    def decoding_settings(self, gen_kwargs=None):
+        """Settings that identify how captions are decoded, used in the caption cache key"""
+        if gen_kwargs is not None or self.decoding == BEAM:
+            return self.gen_kwargs if gen_kwargs is None else gen_kwargs
+        if self.decoding == GREEDY:
+            return self.greedy_kwargs()
+        return dict(self.gen_kwargs, decoding=ADAPTIVE, confidence_threshold=self.confidence_threshold)
+
+    def decode(self, pil_images, gen_kwargs=None):
+        """
+        Caption loaded images with explicit gen_kwargs, or with the configured decoding.
+        
+        Args:
+            pil_images: List of RGB PIL Images
+            gen_kwargs: Generation settings; when given they are used as is
+            
+        Returns:
+            captions: List of captions, in the same order as pil_images
+        """
+        if gen_kwargs is not None or self.decoding == BEAM:
+            return self.generate_captions(pil_images, gen_kwargs)
+        if self.decoding == GREEDY:
+            return self.generate_captions(pil_images, self.greedy_kwargs())
+
+        captions, confidences = self.generate_greedy(pil_images, self.greedy_kwargs()["max_length"])
+        uncertain = [i for i, confidence in enumerate(confidences) if confidence < self.confidence_threshold]
+        if uncertain:
+            # Only the uncertain captions pay for beam search
+            for i, caption in zip(uncertain, self.generate_captions([pil_images[i] for i in uncertain], self.gen_kwargs)):
+                captions[i] = caption
+        return captions
+
+    def load_image(self, image):
+        """
+        Load an image into an RGB PIL Image.
+        
+        Args:
+            image: Path to an image file, a PIL Image or an RGB numpy array
+            
+        Returns:
+            image: RGB PIL Image
+        """
+        if isinstance(image, Image.Image):
+            return image if image.mode == "RGB" else image.convert("RGB")
+        if isinstance(image, np.ndarray):
+            return Image.fromarray(image).convert("RGB")
+        return Image.open(image).convert("RGB")
+
+    def predict_caption(self, image_path, save_image=True):
+        """
+        Generate a caption for an image using the ViT-GPT2 model.
+        
+        Args:
+            image_path: Path to the image file
+            save_image: Whether to save the captioned image (in the background)
+            
+        Returns:
+            caption: Generated caption for the image
+        """
+        return self.predict_captions([image_path], batch_size=1, save_image=save_image)[0]
+
+    def predict_captions(self, images, batch_size=8, save_image=False, image_paths=None, gen_kwargs=None):
+        """
+        Generate captions for several images using batched inference.
+        
+        Images are processed in batches of ``batch_size``: the pixel values of
+        a batch are stacked into a single tensor and captioned with one
+        ``generate`` call, which is much faster than captioning
+        the images one by one on CPU.
+        
+        Args:
+            images: List of image paths, PIL Images or RGB numpy arrays
+            batch_size: Number of images per generate call
+            save_image: Whether to save the captioned images; they are written
+                in the background, see render.flush_writes()
+            image_paths: Optional list of paths used to name the captioned
+                images of in-memory frames (None entries are not saved)
+            gen_kwargs: Generation settings; None uses the configured decoding
+            
+        Returns:
+            captions: List of generated captions, in the same order as images;
+                ERROR_CAPTION for images that could not be loaded or captioned
+        """
+        captions = []
+        batch_size = max(1, int(batch_size))
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            batch_paths = image_paths[start:start + batch_size] if image_paths is not None else \
+                [image if isinstance(image, str) else None for image in batch]
+
+            # Load images one by one, so an unreadable image only fails its own caption
+            pil_images = []
+            for image in batch:
+                try:
+                    pil_images.append(self.load_image(image))
+                except Exception as e:
+                    traceback.print_exc()
+                    print(f"Error loading image: {str(e)}")
+                    pil_images.append(None)
+            loaded = [i for i, img in enumerate(pil_images) if img is not None]
+            batch_captions = [ERROR_CAPTION] * len(batch)
+            for i, caption in zip(loaded, self.caption_batch([pil_images[i] for i in loaded], gen_kwargs)):
+                batch_captions[i] = caption
+
+            if save_image:
+                # Rendering runs on the background writer, so the next batch does not wait for it
+                writer = get_writer()
+                for image_path, img, caption in zip(batch_paths, pil_images, batch_captions):
+                    if image_path is not None and caption != ERROR_CAPTION:
+                        writer.submit(img, caption, image_path)
+
+            captions.extend(batch_captions)
+        return captions
+
+    def caption_batch(self, pil_images, gen_kwargs=None):
+        """
+        Caption loaded images together, retrying them one at a time if the batch fails.
+        
+        Args:
+            pil_images: List of RGB PIL Images
+            gen_kwargs: Generation settings; None uses the configured decoding
+            
+        Returns:
+            captions: List of captions, ERROR_CAPTION for images that failed on their own
+        """
+        if not pil_images:
+            return []
+        try:
+            return self.caption_images(pil_images, gen_kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error predicting caption: {str(e)}")
+        if len(pil_images) == 1:
+            return [ERROR_CAPTION]
+        return [self.caption_batch([img], gen_kwargs)[0] for img in pil_images]
+
+    def caption_images(self, pil_images, gen_kwargs=None):
+        """
+        Caption loaded images, using the caption cache when one is configured.
+        
+        Only images whose pixels, model and generation settings are not in the
+        cache are run through the model; their captions are then stored.
+        
+        Args:
+            pil_images: List of RGB PIL Images
+            gen_kwargs: Generation settings; None uses the configured decoding
+            
+        Returns:
+            captions: List of captions, in the same order as pil_images
+        """
+        if self.cache is None:
+            return self.decode(pil_images, gen_kwargs)
+
+        settings = self.decoding_settings(gen_kwargs)
+        keys = [caption_key(image_digest(img), self.cache_model_name, settings) for img in pil_images]
+        captions = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in captions]
+        if missing:
+            generated = self.decode([pil_images[i] for i in missing], gen_kwargs)
+            self.cache.put_many((keys[i], caption) for i, caption in zip(missing, generated))
+            captions.update((keys[i], caption) for i, caption in zip(missing, generated))
+        return [captions[key] for key in keys]
+
+    def save_captioned_image(self, img, caption, image_path):
+        """
+        Save the image with its caption overlaid, without waiting for the background writer.
+        
+        Args:
+            img: PIL Image object
+            caption: Caption text
+            image_path: Path to original image
+        """
+        return save_captioned_image(img, caption, image_path)
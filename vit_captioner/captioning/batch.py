@@ -0,0 +1,188 @@
+"""
+captioning/batch.py - Caption many videos in one process with a single loaded model
+"""
+
+import os
+import glob
+import json
+import time
+import datetime
+import traceback
+import concurrent.futures
+from .base import create_captioner
+from .video import VideoToCaption, VIDEO_EXTENSIONS, is_normalized_link
+from .engine import ProcessCaptioningEngine
+from .render import flush_writes
+from .constants import FP32, BEAM, DEFAULT_CONFIDENCE_THRESHOLD
+
+MANIFEST_EXTENSIONS = ('.txt', '.lst', '.list', '.json')
+
+
+def read_manifest(manifest_path):
+    """
+    Read video paths from a manifest file.
+
+    A manifest is either a JSON list of paths or a text file with one path per
+    line (blank lines and lines starting with # are ignored). Relative paths
+    are resolved against the manifest's directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path) as f:
+        if manifest_path.lower().endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+    return [entry if os.path.isabs(entry) else os.path.join(base_dir, entry) for entry in entries]
+
+
+def collect_videos(inputs):
+    """
+    Expand directories, glob patterns and manifest files into video paths.
+
+    Args:
+        inputs: List of video files, directories, glob patterns or manifests
+
+    Directory and glob matches skip the lowercase-extension symlinks that
+    earlier runs leave next to videos, and paths that resolve to the same
+    file are only kept once.
+
+    Returns:
+        List of unique video paths in input order
+    """
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            videos.extend(sorted(p for p in (os.path.join(item, f) for f in os.listdir(item)
+                                             if f.lower().endswith(VIDEO_EXTENSIONS) and not f.startswith('.'))
+                                 if not is_normalized_link(p)))
+        elif os.path.isfile(item) and item.lower().endswith(MANIFEST_EXTENSIONS):
+            videos.extend(read_manifest(item))
+        elif os.path.isfile(item):
+            videos.append(item)
+        else:
+            videos.extend(sorted(p for p in glob.glob(item, recursive=True)
+                                 if p.lower().endswith(VIDEO_EXTENSIONS) and not is_normalized_link(p)))
+    unique = {}
+    for video in videos:
+        unique.setdefault(os.path.realpath(video), video)
+    return list(unique.values())
+
+
+class BatchVideoCaptioner:
+    """
+    Caption a list of videos with one loaded model.
+
+    Frames of video k+1 are extracted on a background thread while video k
+    is being captioned, so decoding overlaps with inference. A video that
+    cannot be opened or decoded is reported and skipped. A summary with the
+    outputs, counts, timings and errors of every video is written at the end.
+    """
+
+    def __init__(self, video_paths, summary_path=None, verbose=False, **converter_kwargs):
+        self.video_paths = list(video_paths)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.summary_path = summary_path or f"caption_summary_{timestamp}.json"
+        self.verbose = verbose
+        # Remaining VideoToCaption options (num_frames, batch_size, workers, ...)
+        self.converter_kwargs = converter_kwargs
+
+    def create_captioner(self):
+        """Create the captioner shared by every video"""
+        workers = self.converter_kwargs.get('workers', 1)
+        cache = self.converter_kwargs.get('cache')
+        options = {
+            "precision": self.converter_kwargs.get('precision', FP32),
+            "onnx_dir": self.converter_kwargs.get('onnx_dir'),
+            "decoding": self.converter_kwargs.get('decoding', BEAM),
+            "confidence_threshold": self.converter_kwargs.get('confidence_threshold', DEFAULT_CONFIDENCE_THRESHOLD),
+            "encoder_cache": self.converter_kwargs.get('encoder_cache'),
+        }
+        if workers > 1:
+            # Workers reopen the caches from their constructor arguments, keeping the size limits
+            return ProcessCaptioningEngine(workers, self.converter_kwargs.get('threads'),
+                                           captioner_kwargs=dict(options, cache=cache))
+        return create_captioner(cache=cache, **options)
+
+    def extract(self, video_path, captioner):
+        """
+        Open a video and extract its frames.
+
+        Returns:
+            (converter, frames, seconds): the VideoToCaption, its frames and the time it took
+        """
+        start = time.time()
+        if not os.path.isfile(video_path):
+            raise FileNotFoundError(f"Video not found: {video_path}")
+        converter = VideoToCaption(video_path, verbose=self.verbose, captioner=captioner, **self.converter_kwargs)
+        frames = converter.extract_frames()
+        return converter, frames, time.time() - start
+
+    def run(self):
+        """
+        Caption every video and write the summary.
+
+        Returns:
+            List of per-video summary dictionaries
+        """
+        summary = []
+        if not self.video_paths:
+            print("No videos to caption.")
+            return summary
+
+        captioner = self.create_captioner()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as prefetcher:
+                # Videos are opened on the prefetch thread too, so an unreadable one only fails its own entry
+                pending = prefetcher.submit(self.extract, self.video_paths[0], captioner)
+                for k, video_path in enumerate(self.video_paths):
+                    print(f"[{k + 1}/{len(self.video_paths)}] Captioning {video_path}")
+                    entry = {"video": video_path, "status": "failed"}
+                    try:
+                        converter, frames, decode_time = pending.result()
+                    except Exception as e:
+                        traceback.print_exc()
+                        print(f"Error opening {video_path}, skipping it: {str(e)}")
+                        converter, frames, decode_time = None, [], 0.0
+                        entry["error"] = str(e)
+                    # Start decoding the next video while this one is captioned
+                    if k + 1 < len(self.video_paths):
+                        pending = prefetcher.submit(self.extract, self.video_paths[k + 1], captioner)
+
+                    start = time.time()
+                    if not frames:
+                        entry.setdefault("error", "No frames extracted")
+                    elif converter.convert(frames=frames):
+                        entry.update({
+                            "status": "ok",
+                            "srt": converter.output_srt,
+                            "json": converter.output_json,
+                            "frames": len(frames),
+                            "captions": len(converter.srt_entries),
+                        })
+                    else:
+                        entry["error"] = "Captioning failed"
+                    entry["decode_seconds"] = round(decode_time, 3)
+                    entry["caption_seconds"] = round(time.time() - start, 3)
+                    summary.append(entry)
+        finally:
+            if isinstance(captioner, ProcessCaptioningEngine):
+                captioner.close()
+            # Captioned images of the last videos may still be queued on the background writer
+            flush_writes()
+
+        self.save_summary(summary)
+        return summary
+
+    def save_summary(self, summary):
+        """Save the per-video summary as JSON"""
+        try:
+            with open(self.summary_path, 'w') as f:
+                json.dump(summary, f, indent=4)
+            succeeded = sum(1 for entry in summary if entry["status"] == "ok")
+            print(f"Captioned {succeeded}/{len(summary)} videos. Summary saved to {self.summary_path}")
+            for entry in summary:
+                if entry["status"] != "ok":
+                    print(f"Failed: {entry['video']} ({entry.get('error', 'unknown error')})")
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error saving summary: {str(e)}")
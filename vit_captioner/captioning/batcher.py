@@ -0,0 +1,157 @@
+"""
+captioning/batcher.py - Dynamic batching of concurrent caption requests
+"""
+
+import json
+import time
+import queue
+import threading
+import traceback
+import concurrent.futures
+from .constants import ERROR_CAPTION
+
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5
+
+# Queue item that stops the batching thread
+_STOP = object()
+
+
+class DynamicBatcher:
+    """
+    Collect caption requests from many threads into batched generate calls.
+
+    Callers submit single images and get a Future back. A background thread
+    takes the first waiting request, keeps collecting for up to max_wait_ms
+    or until max_batch_size requests are queued, and captions them together
+    with one predict_captions() call on the wrapped captioner. Requests with
+    different generation settings are captioned in separate calls.
+
+    The batcher exposes predict_captions()/predict_caption() like
+    ImageCaptioner, so it can be passed as the captioner of VideoToCaption.
+    """
+
+    def __init__(self, captioner, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.captioner = captioner
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="caption-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, image_path=None, gen_kwargs=None):
+        """
+        Queue one image for captioning.
+
+        Args:
+            image: Path to an image file, a PIL Image or an RGB numpy array
+            image_path: Path to save the captioned image to, or None to not save it
+            gen_kwargs: Generation settings overriding the captioner's defaults
+
+        Returns:
+            Future resolving to the caption; it raises if the image cannot be
+            loaded or captioned
+        """
+        future = concurrent.futures.Future()
+        self._queue.put((image, image_path, gen_kwargs, future))
+        return future
+
+    def predict_captions(self, images, batch_size=None, save_image=False, image_paths=None, gen_kwargs=None):
+        """
+        Caption several images through the shared batches.
+
+        batch_size is accepted for interface compatibility; batches are
+        formed across all callers up to max_batch_size. Images that fail
+        get ERROR_CAPTION, like ImageCaptioner.predict_captions().
+        """
+        if image_paths is None:
+            image_paths = [image if isinstance(image, str) else None for image in images]
+        futures = [self.submit(image, image_path if save_image else None, gen_kwargs)
+                   for image, image_path in zip(images, image_paths)]
+        captions = []
+        for future in futures:
+            try:
+                captions.append(future.result())
+            except Exception:
+                # Already reported on the batching thread
+                captions.append(ERROR_CAPTION)
+        return captions
+
+    def predict_caption(self, image_path, save_image=True):
+        """Generate a caption for a single image"""
+        return self.predict_captions([image_path], save_image=save_image)[0]
+
+    def pending(self):
+        """Number of requests waiting to be batched"""
+        return self._queue.qsize()
+
+    def _collect(self, first):
+        """Gather requests arriving within max_wait of the first one"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then stop
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        """Batching loop run on the background thread"""
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+
+            # Requests with different generation settings cannot share a generate call
+            groups = {}
+            for item in batch:
+                groups.setdefault(json.dumps(item[2], sort_keys=True, default=str), []).append(item)
+            for items in groups.values():
+                self._caption(items)
+
+    def _caption(self, items):
+        """Caption one group of requests and resolve their futures, failing only the requests that fail"""
+        self.batches += 1
+        self.requests += len(items)
+
+        # Load every image on its own, so a bad input fails only its own request
+        loaded = []
+        for image, image_path, _, future in items:
+            try:
+                loaded.append((self.captioner.load_image(image), image_path, future))
+            except Exception as e:
+                print(f"Error loading image: {str(e)}")
+                future.set_exception(e)
+        if not loaded:
+            return
+
+        try:
+            captions = self.captioner.predict_captions([img for img, _, _ in loaded], batch_size=len(loaded),
+                                                       save_image=True,
+                                                       image_paths=[image_path for _, image_path, _ in loaded],
+                                                       gen_kwargs=items[0][2])
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error predicting batched captions: {str(e)}")
+            captions = [ERROR_CAPTION] * len(loaded)
+        for (_, _, future), caption in zip(loaded, captions):
+            if caption == ERROR_CAPTION:
+                future.set_exception(Exception("Error generating caption"))
+            else:
+                future.set_result(caption)
+
+    def close(self):
+        """Stop the batching thread once queued requests are captioned"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
@@ -0,0 +1,141 @@
+"""
+captioning/cache.py - Content-addressed caption cache stored in SQLite
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import traceback
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "vit_captioner", "captions.sqlite")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Approximate per-row storage overhead counted towards max_bytes
+ROW_OVERHEAD = 64
+
+
+def image_digest(image):
+    """
+    Hash the decoded pixels of a PIL Image.
+
+    The digest depends only on the pixel data, size and mode, so the same
+    frame gives the same digest whether it came from a file or a decoder.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def caption_key(digest, model_name, gen_kwargs):
+    """Cache key for an image digest captioned by a model with given generation settings"""
+    settings = json.dumps(gen_kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(f"{digest}|{model_name}|{settings}".encode()).hexdigest()
+
+
+class CaptionCache:
+    """
+    Persistent caption cache with size-based LRU eviction.
+
+    Captions are stored in a local SQLite file keyed by a hash of the decoded
+    pixels, the model name and the generation settings, so captioning the
+    same content again skips the model. When the stored size exceeds
+    max_bytes the least recently used captions are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                "key TEXT PRIMARY KEY, caption TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS captions_accessed ON captions (accessed)")
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once and mark the hits as recently used.
+
+        Returns:
+            Dictionary mapping the keys that were found to their captions
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        try:
+            with self._lock, self._conn:
+                found = {}
+                # Stay below SQLite's limit on query parameters
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    found.update(self._conn.execute(
+                        f"SELECT key, caption FROM captions WHERE key IN ({placeholders})", chunk).fetchall())
+                now = time.time()
+                self._conn.executemany("UPDATE captions SET accessed = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                return found
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error reading caption cache: {str(e)}")
+            return {}
+
+    def get(self, key):
+        """Return the cached caption for a key, or None"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items):
+        """Store (key, caption) pairs and evict old entries if the cache is over size"""
+        items = list(items)
+        if not items:
+            return
+        try:
+            now = time.time()
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO captions (key, caption, size, accessed) VALUES (?, ?, ?, ?)",
+                    [(key, caption, len(key) + len(caption.encode()) + ROW_OVERHEAD, now) for key, caption in items])
+                self._evict()
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error writing caption cache: {str(e)}")
+
+    def put(self, key, caption):
+        """Store a single caption"""
+        self.put_many([(key, caption)])
+
+    def _evict(self):
+        """Delete least recently used rows until the cache fits in max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM captions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed, stale = 0, []
+        for key, size in self._conn.execute("SELECT key, size FROM captions ORDER BY accessed"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM captions WHERE key = ?", stale)
+
+    def size(self):
+        """Total stored size in bytes"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM captions").fetchone()[0]
+
+    def options(self):
+        """Constructor arguments, to open the same cache with the same size limit in another process"""
+        return {"path": self.path, "max_bytes": self.max_bytes}
+
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
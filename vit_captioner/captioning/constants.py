@@ -0,0 +1,24 @@
+"""
+captioning/constants.py - Model and precision settings shared by every backend
+
+Kept free of heavy imports so modules that only need these names do not load torch.
+"""
+
+DEFAULT_MODEL_NAME = "nlpconnect/vit-gpt2-image-captioning"
+
+# Inference precision modes
+FP32 = "fp32"
+INT8 = "int8"  # Dynamic int8 quantization of the Linear layers (CPU only)
+BF16 = "bf16"  # bfloat16 autocast over fp32 weights
+PRECISIONS = (FP32, INT8, BF16)
+
+# Decoding strategies
+BEAM = "beam"  # Beam search with the captioner's gen_kwargs
+GREEDY = "greedy"  # One candidate per step; stops as soon as every row has ended
+ADAPTIVE = "adaptive"  # Greedy, re-decoding low-confidence captions with beam search
+DECODING_STRATEGIES = (BEAM, GREEDY, ADAPTIVE)
+# Adaptive decoding escalates a caption when its least likely token is below this probability
+DEFAULT_CONFIDENCE_THRESHOLD = 0.3
+
+# Caption returned for an image that could not be loaded or captioned
+ERROR_CAPTION = "Error generating caption"
@@ -0,0 +1,73 @@
+"""
+captioning/dedup.py - Near-duplicate frame detection so identical frames are captioned once
+"""
+
+import numpy as np
+from PIL import Image
+from ..utils.image_hash import load_pil, dhash, hamming_distances
+
+DEFAULT_THRESHOLD = 4
+# Mean absolute difference (0-255) of the colour thumbnails above which frames never merge
+DEFAULT_COLOUR_TOLERANCE = 12
+COLOUR_THUMBNAIL_SIZE = 8
+
+
+def colour_thumbnail(image, size=COLOUR_THUMBNAIL_SIZE):
+    """
+    Reduce an image to a size x size RGB thumbnail.
+
+    The difference hash only sees grayscale gradients, so frames that differ
+    mainly in colour are told apart by comparing these thumbnails.
+
+    Returns:
+        float32 array of shape (size, size, 3)
+    """
+    return np.asarray(load_pil(image).convert("RGB").resize((size, size), Image.BILINEAR), dtype=np.float32)
+
+
+class FrameDeduplicator:
+    """
+    Match each frame against the group of the frame before it.
+
+    Every frame gets a group id: a frame within ``threshold`` hash bits of
+    the most recent group's first frame, and whose colour thumbnail differs
+    from it by at most ``colour_tolerance`` on average, joins that group and
+    reuses its caption; otherwise it starts a new group and has to be
+    captioned. Only the most recent group is compared, so frames from
+    different shots never share a caption through an older, similar-looking
+    frame.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, colour_tolerance=DEFAULT_COLOUR_TOLERANCE):
+        self.threshold = threshold
+        self.colour_tolerance = colour_tolerance
+        self.captions = []
+        # Hash and colour thumbnail of the most recent group's first frame
+        self.last_hash = None
+        self.last_thumbnail = None
+
+    def assign(self, image):
+        """
+        Assign a frame to a group.
+
+        Returns:
+            (group_id, is_new): is_new is True when the frame needs captioning
+        """
+        image = load_pil(image)
+        value, thumbnail = dhash(image), colour_thumbnail(image)
+        if self.last_hash is not None:
+            distance = int(hamming_distances(np.array([self.last_hash], dtype=np.uint64), value)[0])
+            colour_difference = float(np.abs(thumbnail - self.last_thumbnail).mean())
+            if distance <= self.threshold and colour_difference <= self.colour_tolerance:
+                return len(self.captions) - 1, False
+        self.last_hash, self.last_thumbnail = value, thumbnail
+        self.captions.append(None)
+        return len(self.captions) - 1, True
+
+    def set_caption(self, group_id, caption):
+        """Record the caption generated for a group"""
+        self.captions[group_id] = caption
+
+    def caption(self, group_id):
+        """Caption shared by every frame in a group"""
+        return self.captions[group_id]
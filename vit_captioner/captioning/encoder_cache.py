@@ -0,0 +1,94 @@
+"""
+captioning/encoder_cache.py - Cache of ViT encoder outputs so decoding settings can change cheaply
+"""
+
+import os
+import threading
+import traceback
+from collections import OrderedDict
+import numpy as np
+import torch
+
+DEFAULT_MAX_ITEMS = 1024
+
+
+class EncoderCache:
+    """
+    LRU cache of encoder hidden states per frame, with an optional on-disk copy.
+
+    Entries are keyed by a hash of the decoded pixels and the model, and held
+    in memory as CPU tensors up to max_items. When spill_dir is set, every
+    entry is also written there as a .npy file when it is added, and entries
+    no longer in memory are loaded back on lookup, so a later run with
+    different generation settings only has to re-run the decoder.
+    """
+
+    def __init__(self, max_items=DEFAULT_MAX_ITEMS, spill_dir=None):
+        self.max_items = max(1, int(max_items))
+        self.spill_dir = spill_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_dir and not os.path.exists(spill_dir):
+            os.makedirs(spill_dir)
+
+    def _spill_path(self, key):
+        """File an entry is spilled to"""
+        return os.path.join(self.spill_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Return the cached hidden states for a key as a CPU tensor, or None"""
+        with self._lock:
+            hidden = self._entries.get(key)
+            if hidden is not None:
+                self._entries.move_to_end(key)
+                return hidden
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            try:
+                hidden = torch.from_numpy(np.load(self._spill_path(key)))
+                self.put(key, hidden)
+                return hidden
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Error loading spilled encoder output: {str(e)}")
+        return None
+
+    def put(self, key, hidden):
+        """
+        Store hidden states for a key, and write them to spill_dir when it is set.
+
+        Args:
+            key: Cache key
+            hidden: Hidden states of a single image, shape (seq_len, hidden_size)
+        """
+        hidden = hidden.detach().to("cpu")
+        with self._lock:
+            self._entries[key] = hidden
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        # Written through on insert, so every entry survives the process without an explicit flush
+        if self.spill_dir:
+            self._spill(key, hidden)
+
+    def _spill(self, key, hidden):
+        """Write one entry to spill_dir unless it is already there"""
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            # Write to a temporary file first so readers never see a partial array
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, hidden.float().numpy())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error spilling encoder output: {str(e)}")
+
+    def options(self):
+        """Constructor arguments, to open an equivalent cache in another process"""
+        return {"max_items": self.max_items, "spill_dir": self.spill_dir}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,121 @@
+"""
+captioning/engine.py - Multi-process captioning engine for CPU-only hosts
+"""
+
+import os
+import traceback
+import multiprocessing
+import multiprocessing.util
+import concurrent.futures
+from .constants import DEFAULT_MODEL_NAME, ERROR_CAPTION
+
+# Captioner owned by each worker process
+_worker_captioner = None
+
+
+def _init_worker(model_name, num_threads, captioner_kwargs):
+    """Load a private model copy in a worker and pin its intra-op thread count"""
+    global _worker_captioner
+    from .base import create_captioner
+
+    if not captioner_kwargs.get("onnx_dir"):
+        import torch
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only allowed before any parallel work has started
+            pass
+    _worker_captioner = create_captioner(model_name, device="cpu", num_threads=num_threads, **captioner_kwargs)
+    # Worker processes skip atexit handlers, so write queued captioned images at shutdown explicitly
+    from .render import flush_writes
+    multiprocessing.util.Finalize(None, flush_writes, exitpriority=10)
+
+
+def _caption_batch(images, image_paths, save_image, gen_kwargs):
+    """Caption one batch in a worker process"""
+    return _worker_captioner.predict_captions(images, batch_size=len(images), save_image=save_image,
+                                              image_paths=image_paths, gen_kwargs=gen_kwargs)
+
+
+class ProcessCaptioningEngine:
+    """
+    Caption images on a pool of worker processes, each with its own model.
+
+    Each worker loads its own copy of the model and pins torch to
+    num_threads intra-op threads, so workers do not fight over the GIL or
+    oversubscribe the cores. Batches are fed through the pool's shared work
+    queue and the results are put back in input order. The engine exposes
+    the same predict_captions() interface as ImageCaptioner.
+    """
+
+    def __init__(self, num_workers=None, num_threads=None, model_name=DEFAULT_MODEL_NAME, captioner_kwargs=None):
+        cpu_count = os.cpu_count() or 1
+        self.num_workers = max(1, int(num_workers or max(1, cpu_count // 4)))
+        self.num_threads = max(1, int(num_threads or max(1, cpu_count // self.num_workers)))
+        self.model_name = model_name
+        # Extra ImageCaptioner arguments for the workers. Caches cannot be pickled, so each
+        # worker opens its own from the cache's constructor arguments
+        self.captioner_kwargs = {name: value.options() if hasattr(value, "options") else value
+                                 for name, value in (captioner_kwargs or {}).items()}
+        self._executor = None
+
+    def start(self):
+        """Start the worker processes (done automatically on first use)"""
+        if self._executor is None:
+            # Spawn fresh interpreters so workers never inherit torch's thread pools
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.num_threads, self.captioner_kwargs))
+        return self
+
+    def predict_captions(self, images, batch_size=8, save_image=False, image_paths=None, gen_kwargs=None):
+        """
+        Generate captions for several images across the worker pool.
+
+        Args:
+            images: List of image paths, PIL Images or RGB numpy arrays
+            batch_size: Number of images per batch sent to a worker
+            save_image: Whether workers save the captioned images
+            image_paths: Optional list of paths used to name the captioned
+                images of in-memory frames
+            gen_kwargs: Generation settings overriding the workers' defaults
+
+        Returns:
+            captions: List of generated captions, in the same order as images
+        """
+        self.start()
+        batch_size = max(1, int(batch_size))
+        futures = []
+        for start in range(0, len(images), batch_size):
+            batch = list(images[start:start + batch_size])
+            batch_paths = list(image_paths[start:start + batch_size]) if image_paths is not None else None
+            futures.append((len(batch), self._executor.submit(_caption_batch, batch, batch_paths, save_image, gen_kwargs)))
+
+        captions = []
+        for count, future in futures:
+            try:
+                captions.extend(future.result())
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Error predicting caption in worker: {str(e)}")
+                captions.extend([ERROR_CAPTION] * count)
+        return captions
+
+    def predict_caption(self, image_path, save_image=True):
+        """Generate a caption for a single image"""
+        return self.predict_captions([image_path], batch_size=1, save_image=save_image)[0]
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -2,138 +2,188 @@
 captioning/image.py - Module for generating captions for images using ViT-GPT2 model
 """
 
-import os
-import matplotlib
-# Set matplotlib to use non-interactive backend to avoid GUI threading issues
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from PIL import Image
+import contextlib
 import torch
 import numpy as np
 import traceback
 import random
-from transformers import VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer
 import warnings
+from .base import BaseCaptioner
+from .registry import registry
+from .constants import DEFAULT_MODEL_NAME, FP32, BF16, BEAM, DEFAULT_CONFIDENCE_THRESHOLD, ERROR_CAPTION
+from .cache import image_digest, caption_key
+from .encoder_cache import EncoderCache
+from transformers.modeling_outputs import BaseModelOutput
 
 # Filter out transformer warnings
 warnings.filterwarnings("ignore", category=UserWarning, 
                        message="Some weights of the model checkpoint.*")
 
-class ImageCaptioner:
+class ImageCaptioner(BaseCaptioner):
     # Class variable to track if warnings have been displayed
     _showed_warnings = False
     
-    def __init__(self, model_name="nlpconnect/vit-gpt2-image-captioning"):
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, device=None, cache=None, encoder_cache=None, precision=FP32,
+                 decoding=BEAM, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
         try:
             # Set random seed for reproducibility
             random.seed(23)
             torch.manual_seed(23)
             np.random.seed(23)
             
-            # Load model, tokenizer, and feature extractor
-            self.model = VisionEncoderDecoderModel.from_pretrained(model_name)
-            self.feature_extractor = ViTImageProcessor.from_pretrained(model_name)
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            
-            # Configure device
-            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            self.model.to(self.device)
+            # Get model, tokenizer, and feature extractor from the shared
+            # registry so the weights are only loaded once per process
+            self.model_name = model_name
+            # fp32, int8 (dynamically quantized Linear layers) or bf16 (autocast)
+            self.precision = precision
+            self.model, self.feature_extractor, self.tokenizer, self.device = registry.get(model_name, device, precision)
+            # Reduced precision can change captions, so it is part of the cache identity
+            self.cache_model_name = model_name if precision == FP32 else f"{model_name}@{precision}"
             
             # Set generation kwargs
             self.gen_kwargs = {"max_length": 16, "num_beams": 4}
+            # Decoding strategy used when no explicit gen_kwargs are given: beam, greedy or adaptive
+            self.set_decoding(decoding, confidence_threshold)
+            
+            # Optional persistent caption cache: a CaptionCache, a path, or True for the default path
+            self.cache = self.open_cache(cache)
+            
+            # Optional cache of encoder outputs: an EncoderCache, True for an in-memory one,
+            # a directory to also keep them on disk, or EncoderCache keyword arguments
+            self.encoder_cache = self.open_encoder_cache(encoder_cache)
         except Exception as e:
             traceback.print_exc()
             raise Exception(f"Error initializing ImageCaptioner: {str(e)}")
 
-    def predict_caption(self, image_path, save_image=True):
+    def open_encoder_cache(self, encoder_cache):
+        """Open the optional encoder output cache"""
+        if encoder_cache is True:
+            return EncoderCache()
+        if isinstance(encoder_cache, str):
+            return EncoderCache(spill_dir=encoder_cache)
+        if isinstance(encoder_cache, dict):
+            return EncoderCache(**encoder_cache)
+        return encoder_cache
+
+    def release(self):
+        """Release this captioner's model, at its own precision, from the shared registry"""
+        registry.release(self.model_name, self.device, self.precision)
+        self.model = self.feature_extractor = self.tokenizer = None
+
+    def predict_caption_candidates(self, images, num_candidates=3, batch_size=8, gen_kwargs=None):
         """
-        Generate a caption for an image using the ViT-GPT2 model.
+        Generate several candidate captions per image.
+        
+        With an encoder cache configured, trying different settings or
+        candidate counts on the same images only re-runs the decoder.
         
         Args:
-            image_path: Path to the image file
-            save_image: Whether to save the captioned image
+            images: List of image paths, PIL Images or RGB numpy arrays
+            num_candidates: Number of captions to return per image
+            batch_size: Number of images per generate call
+            gen_kwargs: Generation settings overriding self.gen_kwargs
             
         Returns:
-            caption: Generated caption for the image
+            List with a list of candidate captions per image
         """
-        try:
-            # Load and process image
-            image = Image.open(image_path).convert("RGB")
-            
-            # Process image and generate captions
-            pixel_values = self.feature_extractor(images=[image], return_tensors="pt").pixel_values
-            pixel_values = pixel_values.to(self.device)
+        kwargs = dict(self.gen_kwargs if gen_kwargs is None else gen_kwargs)
+        kwargs["num_return_sequences"] = num_candidates
+        if kwargs.get("num_beams", 1) < num_candidates and not kwargs.get("do_sample"):
+            kwargs["num_beams"] = num_candidates
+
+        candidates = []
+        batch_size = max(1, int(batch_size))
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            try:
+                captions = self.generate_captions([self.load_image(image) for image in batch], kwargs)
+                candidates.extend(captions[i:i + num_candidates] for i in range(0, len(captions), num_candidates))
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Error predicting caption candidates: {str(e)}")
+                candidates.extend([[ERROR_CAPTION]] * len(batch))
+        return candidates
+
+    def encode_images(self, pil_images):
+        """
+        Run the ViT encoder on loaded images, reusing cached outputs.
+        
+        Args:
+            pil_images: List of RGB PIL Images
             
-            output_ids = self.model.generate(pixel_values, **self.gen_kwargs)
-            captions = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
-            caption = captions[0].strip()
+        Returns:
+            Encoder hidden states of shape (batch, seq_len, hidden_size) on self.device
+        """
+        keys = [caption_key(image_digest(img), self.cache_model_name, "encoder") for img in pil_images]
+        hidden = [self.encoder_cache.get(key) for key in keys]
+        missing = [i for i, h in enumerate(hidden) if h is None]
+        if missing:
+            pixel_values = self.feature_extractor(images=[pil_images[i] for i in missing], return_tensors="pt").pixel_values
+            with torch.no_grad(), self.inference_context():
+                encoded = self.model.encoder(pixel_values=pixel_values.to(self.device)).last_hidden_state.float()
+            for i, h in zip(missing, encoded):
+                self.encoder_cache.put(keys[i], h)
+                hidden[i] = h
+        return torch.stack([h.to(self.device) for h in hidden])
 
-            if save_image:
-                try:
-                    self.save_captioned_image(image, caption, image_path)
-                except Exception as e:
-                    traceback.print_exc()
-                    print(f"Error in saving captioned image: {str(e)}")
+    def inference_context(self):
+        """Context manager running the model in this captioner's precision"""
+        if self.precision == BF16:
+            return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
 
-            return caption
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error predicting caption: {str(e)}")
-            return "Error generating caption"
+    def generate(self, pil_images, **kwargs):
+        """
+        Run model.generate() on a batch of loaded images.
+        
+        With an encoder cache configured the encoder and decoder run
+        separately, so only the decoder runs for images seen before.
+        """
+        if self.encoder_cache is not None:
+            encoder_outputs = BaseModelOutput(last_hidden_state=self.encode_images(pil_images))
+            with self.inference_context():
+                return self.model.generate(encoder_outputs=encoder_outputs, **kwargs)
+        # Stack pixel values and generate captions for the whole batch
+        pixel_values = self.feature_extractor(images=pil_images, return_tensors="pt").pixel_values
+        pixel_values = pixel_values.to(self.device)
+        with self.inference_context():
+            return self.model.generate(pixel_values, **kwargs)
 
-    def save_captioned_image(self, img, caption, image_path):
+    def generate_captions(self, pil_images, gen_kwargs=None):
         """
-        Save the image with its caption overlaid.
+        Run the model on a batch of loaded images.
         
         Args:
-            img: PIL Image object
-            caption: Caption text
-            image_path: Path to original image
-        """
-        try:
-            # Adjust path to use current directory if it's empty
-            output_dir = os.path.dirname(image_path) or '.'
-            img_save_path = os.path.join(output_dir, f'{os.path.splitext(os.path.basename(image_path))[0]}_captioned.jpg')
-            caption_data_path = os.path.join(output_dir, f'{os.path.splitext(os.path.basename(image_path))[0]}_caption_data.txt')
+            pil_images: List of RGB PIL Images
+            gen_kwargs: Generation settings overriding self.gen_kwargs
             
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
+        Returns:
+            captions: List of generated captions (num_return_sequences per image)
+        """
+        gen_kwargs = self.gen_kwargs if gen_kwargs is None else gen_kwargs
+        output_ids = self.generate(pil_images, **gen_kwargs)
+        return [c.strip() for c in self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)]
 
-            # Save the caption data separately
-            with open(caption_data_path, 'w') as f:
-                f.write(caption)
-            
-            # Thread-safe figure creation
-            try:
-                # Create a new figure and make sure it's not shared between threads
-                plt.figure(figsize=(10, 10), clear=True)
-                plt.clf()  # Clear the figure to be sure
-                
-                # Convert PIL Image to numpy array if needed
-                if isinstance(img, Image.Image):
-                    img_array = np.array(img)
-                    plt.imshow(img_array)
-                else:
-                    plt.imshow(img)
-                    
-                plt.title(caption)
-                plt.axis("off")
-                plt.tight_layout()
-                plt.savefig(img_save_path, bbox_inches="tight")
-                
-                # Immediately close the figure to release resources
-                plt.close()
-                
-                print(f"Image saved to {img_save_path}")
-                print(f"Caption data saved to {caption_data_path}")
-            except Exception as e:
-                # If matplotlib fails, save just the original image
-                if isinstance(img, Image.Image):
-                    img.save(img_save_path)
-                    print(f"Saved original image to {img_save_path} (captioning failed: {str(e)})")
-                else:
-                    raise e
-                
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error saving captioned image: {str(e)}")
\ No newline at end of file
+    def generate_greedy(self, pil_images, max_length=16):
+        """
+        Greedily caption a batch and score how confident each caption is.
+        
+        generate() stops as soon as every row has emitted EOS, so batches of
+        short captions do not run to max_length.
+        
+        Returns:
+            (captions, confidences): a caption per image and the probability
+            of its least likely token
+        """
+        output = self.generate(pil_images, max_length=max_length, num_beams=1, do_sample=False,
+                               output_scores=True, return_dict_in_generate=True)
+        log_probs = torch.stack(output.scores, dim=1).float().log_softmax(dim=-1)
+        tokens = output.sequences[:, -log_probs.shape[1]:]
+        chosen = log_probs.gather(-1, tokens.unsqueeze(-1)).squeeze(-1)
+        # Ignore the padding generated after a row's EOS
+        eos_token_ids = self.model.generation_config.eos_token_id
+        ended = torch.isin(tokens, torch.tensor(eos_token_ids, device=tokens.device).reshape(-1)).long()
+        chosen = chosen.masked_fill(ended.cumsum(dim=1) - ended > 0, 0.0)
+        confidences = chosen.min(dim=1).values.exp().tolist()
+        captions = [c.strip() for c in self.tokenizer.batch_decode(output.sequences, skip_special_tokens=True)]
+        return captions, confidences
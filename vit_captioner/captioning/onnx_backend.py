@@ -0,0 +1,263 @@
+"""
+captioning/onnx_backend.py - Captioner running an exported ONNX model on onnxruntime
+
+Running the exported model only needs numpy, onnxruntime and tokenizers, so a
+serving image using this backend can leave torch out. Export a model first
+with onnx_export.export_onnx() or `vit-captioner export-onnx`.
+"""
+
+import os
+import json
+import traceback
+import numpy as np
+from .base import BaseCaptioner
+from .constants import BEAM, DEFAULT_CONFIDENCE_THRESHOLD
+
+ENCODER_FILE = "encoder.onnx"
+DECODER_FILE = "decoder_with_past.onnx"
+CONFIG_FILE = "onnx_config.json"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def log_softmax(x):
+    """Numerically stable log-softmax over the last axis"""
+    x = x - x.max(axis=-1, keepdims=True)
+    return x - np.log(np.exp(x).sum(axis=-1, keepdims=True))
+
+
+class OnnxImageCaptioner(BaseCaptioner):
+    """
+    Image captioner backed by onnxruntime's CPU provider.
+
+    The encoder graph runs once per batch and also produces the decoder's
+    cross-attention keys and values; the decoder-with-past graph then runs
+    once per generated token, reusing the keys and values of earlier tokens.
+    Greedy and beam search are implemented in numpy and take the same
+    max_length/num_beams generation settings as ImageCaptioner, behind the
+    same predict_caption()/predict_captions() interface.
+    """
+
+    def __init__(self, model_dir, cache=None, num_threads=None, decoding=BEAM,
+                 confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+                self.config = json.load(f)
+            self.model_name = self.config["model_name"]
+            self.precision = "onnx"
+            self.device = "cpu"
+            # The ONNX graphs may round differently from PyTorch, so cache their captions separately
+            self.cache_model_name = f"{self.model_name}@onnx"
+
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = int(num_threads)
+            providers = ["CPUExecutionProvider"]
+            self.encoder = onnxruntime.InferenceSession(os.path.join(model_dir, ENCODER_FILE), options, providers=providers)
+            self.decoder = onnxruntime.InferenceSession(os.path.join(model_dir, DECODER_FILE), options, providers=providers)
+            self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+
+            num_layers = self.config["num_layers"]
+            self.cross_names = [f"cross_{kind}_{i}" for i in range(num_layers) for kind in ("key", "value")]
+            self.past_names = [f"past_{kind}_{i}" for i in range(num_layers) for kind in ("key", "value")]
+            self.eos_token_ids = np.array(self.config["eos_token_ids"])
+
+            # Set generation kwargs
+            self.gen_kwargs = {"max_length": 16, "num_beams": 4}
+            # Decoding strategy used when no explicit gen_kwargs are given: beam, greedy or adaptive
+            self.set_decoding(decoding, confidence_threshold)
+
+            # Optional persistent caption cache: a CaptionCache, a path, or True for the default path
+            self.cache = self.open_cache(cache)
+        except Exception as e:
+            traceback.print_exc()
+            raise Exception(f"Error initializing OnnxImageCaptioner: {str(e)}")
+
+    def preprocess(self, pil_images):
+        """Resize, rescale and normalize images like the model's ViTImageProcessor"""
+        height, width = self.config["image_size"]
+        pixels = np.stack([np.asarray(img.resize((width, height), self.config["resample"]), dtype=np.float32)
+                           for img in pil_images])
+        if self.config.get("do_rescale", True):
+            pixels = pixels * np.float32(self.config["rescale_factor"])
+        if self.config.get("do_normalize", True):
+            pixels = (pixels - np.array(self.config["image_mean"], dtype=np.float32)) / \
+                np.array(self.config["image_std"], dtype=np.float32)
+        return np.ascontiguousarray(pixels.transpose(0, 3, 1, 2))
+
+    def encode(self, pil_images):
+        """Run the encoder graph, returning the cross-attention keys and values of every layer"""
+        return self.encoder.run(None, {"pixel_values": self.preprocess(pil_images)})
+
+    def decode_step(self, tokens, position, past, cross):
+        """
+        Run one decoder step.
+
+        Args:
+            tokens: Last token of every sequence, shape (rows,)
+            position: Position of the tokens in the sequence
+            past: Self-attention keys and values of the previous steps
+            cross: Cross-attention keys and values, one row per sequence
+
+        Returns:
+            (log_probs, present): next-token log probabilities and updated keys and values
+        """
+        rows = len(tokens)
+        feed = {
+            "input_ids": tokens.reshape(rows, 1).astype(np.int64),
+            "position_ids": np.full((rows, 1), position, dtype=np.int64),
+        }
+        feed.update(zip(self.past_names, past))
+        feed.update(zip(self.cross_names, cross))
+        outputs = self.decoder.run(None, feed)
+        return outputs[0], outputs[1:]
+
+    def empty_past(self, rows):
+        """Self-attention keys and values before the first step"""
+        shape = (rows, self.config["num_heads"], 0, self.config["head_dim"])
+        return [np.zeros(shape, dtype=np.float32) for _ in self.past_names]
+
+    def greedy_search(self, cross, max_length):
+        """
+        Pick the most likely token at every step until every row has ended.
+
+        Returns:
+            (sequences, confidences): token ids per row and the probability of
+            each row's least likely token
+        """
+        rows = cross[0].shape[0]
+        tokens = np.full(rows, self.config["decoder_start_token_id"], dtype=np.int64)
+        past = self.empty_past(rows)
+        sequences = [[] for _ in range(rows)]
+        min_log_probs = np.zeros(rows)
+        finished = np.zeros(rows, dtype=bool)
+        for position in range(max_length - 1):
+            log_probs, past = self.decode_step(tokens, position, past, cross)
+            tokens = log_probs.argmax(axis=-1)
+            for row in np.flatnonzero(~finished):
+                sequences[row].append(int(tokens[row]))
+                min_log_probs[row] = min(min_log_probs[row], log_probs[row, tokens[row]])
+            finished |= np.isin(tokens, self.eos_token_ids)
+            # Stop as soon as every row has emitted EOS
+            if finished.all():
+                break
+        return sequences, np.exp(min_log_probs).tolist()
+
+    def beam_search(self, cross, max_length, num_beams, length_penalty=1.0):
+        """
+        Beam search scored like Hugging Face generate: a finished hypothesis
+        scores its summed log probability divided by its length ** length_penalty.
+        """
+        batch = cross[0].shape[0]
+        rows = batch * num_beams
+        cross = [np.repeat(c, num_beams, axis=0) for c in cross]
+        tokens = np.full(rows, self.config["decoder_start_token_id"], dtype=np.int64)
+        past = self.empty_past(rows)
+        # Only the first beam of each image is live at the start, so the beams do not duplicate each other
+        beam_scores = np.zeros((batch, num_beams), dtype=np.float64)
+        beam_scores[:, 1:] = -1e9
+        beam_tokens = [[] for _ in range(rows)]
+        hypotheses = [[] for _ in range(batch)]
+        done = np.zeros(batch, dtype=bool)
+
+        for position in range(max_length - 1):
+            log_probs, past = self.decode_step(tokens, position, past, cross)
+            vocab_size = log_probs.shape[-1]
+            scores = (beam_scores.reshape(rows, 1) + log_probs).reshape(batch, num_beams * vocab_size)
+            # Keep 2 * num_beams candidates so enough survive when some of them end
+            top = np.argpartition(-scores, 2 * num_beams, axis=1)[:, :2 * num_beams]
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+            next_beams = np.zeros((batch, num_beams), dtype=np.int64)
+            next_tokens = np.zeros((batch, num_beams), dtype=np.int64)
+            next_scores = np.full((batch, num_beams), -1e9)
+            for b in range(batch):
+                if done[b]:
+                    # Keep feeding padding beams so the batch shape stays fixed
+                    next_beams[b] = b * num_beams
+                    next_tokens[b] = self.eos_token_ids[0]
+                    continue
+                filled = 0
+                for rank, candidate in enumerate(top[b]):
+                    beam, token = divmod(int(candidate), vocab_size)
+                    score = scores[b, candidate]
+                    if token in self.eos_token_ids:
+                        # Only candidates that would have made the beam can end it
+                        if rank < num_beams:
+                            tokens_so_far = beam_tokens[b * num_beams + beam] + [token]
+                            self.add_hypothesis(hypotheses[b], tokens_so_far, score, num_beams, length_penalty)
+                        continue
+                    next_beams[b, filled] = b * num_beams + beam
+                    next_tokens[b, filled] = token
+                    next_scores[b, filled] = score
+                    filled += 1
+                    if filled == num_beams:
+                        break
+
+                # Stop once no live beam can beat the worst kept hypothesis
+                if len(hypotheses[b]) == num_beams:
+                    best_live = next_scores[b].max() / ((position + 1) ** length_penalty)
+                    done[b] = best_live <= min(score for score, _ in hypotheses[b])
+
+            order = next_beams.reshape(-1)
+            beam_tokens = [beam_tokens[row] + [int(token)] for row, token in zip(order, next_tokens.reshape(-1))]
+            past = [p[order] for p in past]
+            tokens = next_tokens.reshape(-1)
+            beam_scores = next_scores
+            if done.all():
+                break
+
+        sequences = []
+        for b in range(batch):
+            # Beams still running at max_length compete with the finished ones
+            if not done[b]:
+                for k in range(num_beams):
+                    self.add_hypothesis(hypotheses[b], beam_tokens[b * num_beams + k], beam_scores[b, k],
+                                        num_beams, length_penalty)
+            sequences.append(max(hypotheses[b], key=lambda h: h[0])[1])
+        return sequences
+
+    def add_hypothesis(self, hypotheses, tokens, score, num_beams, length_penalty):
+        """Keep the num_beams best finished hypotheses of one image"""
+        hypotheses.append((score / (len(tokens) ** length_penalty), tokens))
+        if len(hypotheses) > num_beams:
+            hypotheses.remove(min(hypotheses, key=lambda h: h[0]))
+
+    def generate_captions(self, pil_images, gen_kwargs=None):
+        """
+        Run the ONNX model on a batch of loaded images.
+
+        Args:
+            pil_images: List of RGB PIL Images
+            gen_kwargs: Generation settings (max_length, num_beams, length_penalty)
+                overriding self.gen_kwargs
+
+        Returns:
+            captions: List of generated captions
+        """
+        gen_kwargs = self.gen_kwargs if gen_kwargs is None else gen_kwargs
+        max_length = gen_kwargs.get("max_length", 16)
+        num_beams = gen_kwargs.get("num_beams", 1)
+        cross = self.encode(pil_images)
+        if num_beams > 1:
+            sequences = self.beam_search(cross, max_length, num_beams, gen_kwargs.get("length_penalty", 1.0))
+        else:
+            sequences, _ = self.greedy_search(cross, max_length)
+        return self.detokenize(sequences)
+
+    def generate_greedy(self, pil_images, max_length=16):
+        """
+        Greedily caption a batch and score how confident each caption is.
+
+        Returns:
+            (captions, confidences): a caption per image and the probability
+            of its least likely token
+        """
+        sequences, confidences = self.greedy_search(self.encode(pil_images), max_length)
+        return self.detokenize(sequences), confidences
+
+    def detokenize(self, sequences):
+        """Decode token id sequences into caption strings"""
+        return [self.tokenizer.decode(sequence, skip_special_tokens=True).strip() for sequence in sequences]
@@ -0,0 +1,192 @@
+"""
+captioning/onnx_export.py - Export the captioning model to ONNX encoder and decoder-with-past graphs
+"""
+
+import os
+import json
+import traceback
+import torch
+from .registry import registry
+from .constants import DEFAULT_MODEL_NAME
+from .onnx_backend import ENCODER_FILE, DECODER_FILE, CONFIG_FILE, TOKENIZER_FILE
+
+DEFAULT_OPSET = 17
+
+
+def split_heads(x, num_heads):
+    """(batch, length, hidden) -> (batch, heads, length, head_dim)"""
+    batch, length, hidden = x.shape
+    return x.view(batch, length, num_heads, hidden // num_heads).transpose(1, 2)
+
+
+def merge_heads(x):
+    """(batch, heads, length, head_dim) -> (batch, length, hidden)"""
+    batch, heads, length, head_dim = x.shape
+    return x.transpose(1, 2).reshape(batch, length, heads * head_dim)
+
+
+def attention_scale(config, layer_idx):
+    """GPT-2's attention score scaling for a layer"""
+    scale = (config.n_embd // config.n_head) ** -0.5 if config.scale_attn_weights else 1.0
+    if config.scale_attn_by_inverse_layer_idx:
+        scale /= float(layer_idx + 1)
+    return scale
+
+
+def attend(query, key, value, scale):
+    """Scaled dot-product attention without a mask"""
+    weights = torch.softmax(torch.matmul(query, key.transpose(-1, -2)) * scale, dim=-1)
+    return torch.matmul(weights, value)
+
+
+class EncoderGraph(torch.nn.Module):
+    """
+    ViT encoder followed by the cross-attention key/value projections of every decoder layer.
+
+    The projections only depend on the image, so computing them here means
+    the decoder graph does not redo them at every generated token.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.encoder
+        # Present when the encoder and decoder hidden sizes differ
+        self.enc_to_dec_proj = getattr(model, "enc_to_dec_proj", None)
+        self.blocks = model.decoder.transformer.h
+        self.num_heads = model.config.decoder.n_head
+
+    def forward(self, pixel_values):
+        hidden = self.encoder(pixel_values=pixel_values).last_hidden_state
+        if self.enc_to_dec_proj is not None:
+            hidden = self.enc_to_dec_proj(hidden)
+        outputs = []
+        for block in self.blocks:
+            key, value = block.crossattention.c_attn(hidden).split(hidden.shape[-1], dim=2)
+            outputs += [split_heads(key, self.num_heads), split_heads(value, self.num_heads)]
+        return tuple(outputs)
+
+
+class DecoderStepGraph(torch.nn.Module):
+    """
+    One GPT-2 decoding step over a single new token per sequence.
+
+    Inputs are the token ids and positions, then the self-attention keys and
+    values of the previous steps (length 0 on the first step), then the
+    cross-attention keys and values from EncoderGraph. Outputs are the
+    next-token log probabilities and the updated self-attention keys and values.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.transformer = model.decoder.transformer
+        self.lm_head = model.decoder.lm_head
+        self.config = model.config.decoder
+        self.num_layers = self.config.n_layer
+
+    def forward(self, input_ids, position_ids, *states):
+        past, cross = states[:2 * self.num_layers], states[2 * self.num_layers:]
+        num_heads = self.config.n_head
+        hidden = self.transformer.wte(input_ids) + self.transformer.wpe(position_ids)
+        presents = []
+        for i, block in enumerate(self.transformer.h):
+            scale = attention_scale(self.config, i)
+
+            # Causal self-attention: the new token attends to every earlier token
+            query, key, value = block.attn.c_attn(block.ln_1(hidden)).split(self.config.n_embd, dim=2)
+            key = torch.cat([past[2 * i], split_heads(key, num_heads)], dim=2)
+            value = torch.cat([past[2 * i + 1], split_heads(value, num_heads)], dim=2)
+            attended = attend(split_heads(query, num_heads), key, value, scale)
+            hidden = hidden + block.attn.c_proj(merge_heads(attended))
+            presents += [key, value]
+
+            # Cross-attention over the image
+            query = block.crossattention.q_attn(block.ln_cross_attn(hidden))
+            attended = attend(split_heads(query, num_heads), cross[2 * i], cross[2 * i + 1], scale)
+            hidden = hidden + block.crossattention.c_proj(merge_heads(attended))
+
+            hidden = hidden + block.mlp(block.ln_2(hidden))
+
+        logits = self.lm_head(self.transformer.ln_f(hidden))[:, -1]
+        return (torch.log_softmax(logits.float(), dim=-1),) + tuple(presents)
+
+
+def export_onnx(output_dir, model_name=DEFAULT_MODEL_NAME, opset=DEFAULT_OPSET):
+    """
+    Export the captioning model for OnnxImageCaptioner.
+
+    Writes the encoder graph, the decoder-with-past graph, the tokenizer and
+    a config with the preprocessing and special-token settings.
+
+    Args:
+        output_dir: Directory to write the files to
+        model_name: Hugging Face model name or local path
+        opset: ONNX opset version
+
+    Returns:
+        output_dir, or None on failure
+    """
+    try:
+        model, feature_extractor, tokenizer, _ = registry.get(model_name, "cpu")
+        os.makedirs(output_dir, exist_ok=True)
+        config = model.config.decoder
+        num_layers, num_heads = config.n_layer, config.n_head
+        head_dim = config.n_embd // num_heads
+        height, width = feature_extractor.size["height"], feature_extractor.size["width"]
+
+        encoder, decoder = EncoderGraph(model).eval(), DecoderStepGraph(model).eval()
+        cross_names = [f"cross_{kind}_{i}" for i in range(num_layers) for kind in ("key", "value")]
+        past_names = [f"past_{kind}_{i}" for i in range(num_layers) for kind in ("key", "value")]
+        present_names = [f"present_{kind}_{i}" for i in range(num_layers) for kind in ("key", "value")]
+
+        pixel_values = torch.zeros(2, 3, height, width)
+        with torch.no_grad():
+            cross = encoder(pixel_values)
+            print("Exporting encoder...")
+            torch.onnx.export(
+                encoder, (pixel_values,), os.path.join(output_dir, ENCODER_FILE), dynamo=False,
+                input_names=["pixel_values"], output_names=cross_names, opset_version=opset,
+                dynamic_axes={"pixel_values": {0: "batch"}, **{name: {0: "batch"} for name in cross_names}})
+
+            print("Exporting decoder...")
+            input_ids = torch.zeros(2, 1, dtype=torch.long)
+            position_ids = torch.ones(2, 1, dtype=torch.long)
+            past = tuple(torch.zeros(2, num_heads, 1, head_dim) for _ in past_names)
+            torch.onnx.export(
+                decoder, (input_ids, position_ids) + past + cross, os.path.join(output_dir, DECODER_FILE),
+                dynamo=False, input_names=["input_ids", "position_ids"] + past_names + cross_names,
+                output_names=["log_probs"] + present_names, opset_version=opset,
+                dynamic_axes={"input_ids": {0: "batch"}, "position_ids": {0: "batch"}, "log_probs": {0: "batch"},
+                              **{name: {0: "batch", 2: "past_length"} for name in past_names},
+                              **{name: {0: "batch", 2: "present_length"} for name in present_names},
+                              **{name: {0: "batch"} for name in cross_names}})
+
+        tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+        generation = model.generation_config
+        start_token_id = generation.decoder_start_token_id
+        if start_token_id is None:
+            start_token_id = model.config.decoder_start_token_id
+        eos_token_ids = generation.eos_token_id
+        if not isinstance(eos_token_ids, (list, tuple)):
+            eos_token_ids = [eos_token_ids]
+        with open(os.path.join(output_dir, CONFIG_FILE), 'w') as f:
+            json.dump({
+                "model_name": model_name,
+                "num_layers": num_layers,
+                "num_heads": num_heads,
+                "head_dim": head_dim,
+                "decoder_start_token_id": start_token_id,
+                "eos_token_ids": list(eos_token_ids),
+                "image_size": [height, width],
+                "resample": int(feature_extractor.resample),
+                "do_rescale": feature_extractor.do_rescale,
+                "rescale_factor": feature_extractor.rescale_factor,
+                "do_normalize": feature_extractor.do_normalize,
+                "image_mean": list(feature_extractor.image_mean),
+                "image_std": list(feature_extractor.image_std),
+            }, f, indent=4)
+        print(f"ONNX model exported to {output_dir}")
+        return output_dir
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error exporting ONNX model: {str(e)}")
+        return None
@@ -0,0 +1,165 @@
+"""
+captioning/registry.py - Process-wide cache of loaded captioning models
+"""
+
+import gc
+import threading
+import traceback
+import torch
+from transformers import VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer
+from transformers.pytorch_utils import Conv1D
+from .constants import DEFAULT_MODEL_NAME, FP32, INT8, PRECISIONS
+
+
+def resolve_device(device=None):
+    """Return the torch device to use, preferring CUDA when it is available"""
+    if device is None:
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return torch.device(device)
+
+
+def conv1d_to_linear(module):
+    """
+    Replace GPT-2's Conv1D layers with equivalent nn.Linear layers in place.
+    
+    Conv1D is a Linear with transposed weights, but dynamic quantization only
+    recognizes nn.Linear, so the decoder would otherwise stay in fp32.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            conv1d_to_linear(child)
+    return module
+
+
+def quantize_model(model):
+    """Quantize the Linear layers of a CPU model to int8 with dynamic activation scaling"""
+    conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def weights_precision(precision):
+    """Precision of the weights a precision mode loads; bf16 autocasts over the fp32 weights"""
+    return INT8 if precision == INT8 else FP32
+
+
+class ModelRegistry:
+    """
+    Thread-safe cache of loaded models keyed by model name, device and weight precision.
+
+    Every ImageCaptioner gets its model, feature extractor and tokenizer from
+    here, so the weights are loaded once per process instead of once per
+    captioner. Loading different keys can happen concurrently; concurrent
+    requests for the same key wait for a single load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._key_locks = {}
+
+    def get(self, model_name=DEFAULT_MODEL_NAME, device=None, precision=FP32):
+        """
+        Get a loaded model, loading it on first use.
+
+        Args:
+            model_name: Hugging Face model name or local path
+            device: Torch device (defaults to CUDA when available, else CPU)
+            precision: fp32, int8 or bf16; bf16 autocasts at inference time
+                and shares the fp32 weights
+
+        Returns:
+            (model, feature_extractor, tokenizer, device) tuple
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+        device = resolve_device(device)
+        if precision == INT8 and device.type != "cpu":
+            print(f"int8 quantization only runs on CPU, ignoring device {device}")
+            device = torch.device("cpu")
+        weights = weights_precision(precision)
+        key = (model_name, str(device), weights)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                model = VisionEncoderDecoderModel.from_pretrained(model_name)
+                feature_extractor = ViTImageProcessor.from_pretrained(model_name)
+                tokenizer = AutoTokenizer.from_pretrained(model_name)
+                model.to(device)
+                model.eval()
+                if weights == INT8:
+                    model = quantize_model(model)
+                entry = (model, feature_extractor, tokenizer, device)
+                with self._lock:
+                    self._entries[key] = entry
+        return entry
+
+    def warmup(self, model_name=DEFAULT_MODEL_NAME, device=None, precision=FP32):
+        """Load a model ahead of time so the first caption does not pay for it"""
+        try:
+            self.get(model_name, device, precision)
+            return True
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error warming up model {model_name}: {str(e)}")
+            return False
+
+    def release(self, model_name=None, device=None, precision=None):
+        """
+        Drop cached models so their memory can be reclaimed.
+
+        Args:
+            model_name: Model to release (all models when None)
+            device: Device to release the model from (all devices when None)
+            precision: Precision whose weights are released (all precisions when None);
+                bf16 shares the fp32 weights
+
+        Returns:
+            Number of released models
+        """
+        weights = None if precision is None else weights_precision(precision)
+        with self._lock:
+            keys = [key for key in self._entries
+                    if (model_name is None or key[0] == model_name)
+                    and (device is None or key[1] == str(resolve_device(device)))
+                    and (weights is None or key[2] == weights)]
+            for key in keys:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+
+        if keys:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return len(keys)
+
+    def loaded(self):
+        """List the (model_name, device, precision) keys currently held in memory"""
+        with self._lock:
+            return list(self._entries)
+
+
+# Default registry shared by the whole process
+registry = ModelRegistry()
+
+
+def warmup(model_name=DEFAULT_MODEL_NAME, device=None, precision=FP32):
+    """Load a model into the shared registry"""
+    return registry.warmup(model_name, device, precision)
+
+
+def release(model_name=None, device=None, precision=None):
+    """Release models from the shared registry"""
+    return registry.release(model_name, device, precision)
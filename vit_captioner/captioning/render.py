@@ -0,0 +1,176 @@
+"""
+captioning/render.py - Captioned-image rendering on a background writer pool
+"""
+
+import os
+import threading
+import traceback
+import concurrent.futures
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_WRITER_THREADS = 2
+# Images queued for writing before submit() blocks, bounding the memory held by the queue
+DEFAULT_MAX_PENDING = 64
+
+
+def load_font(size):
+    """Pillow's built-in font at the given size (fixed size on Pillow < 10.1)"""
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def wrap_caption(draw, caption, font, max_width):
+    """Split a caption into lines no wider than max_width pixels"""
+    lines = []
+    for word in caption.split():
+        if lines and draw.textlength(f"{lines[-1]} {word}", font=font) <= max_width:
+            lines[-1] = f"{lines[-1]} {word}"
+        else:
+            lines.append(word)
+    return lines or [""]
+
+
+def render_caption(img, caption):
+    """
+    Draw the caption in a white band above the image.
+
+    Args:
+        img: PIL Image or RGB numpy array
+        caption: Caption text
+
+    Returns:
+        image: New RGB PIL Image with the caption band
+    """
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    img = img.convert("RGB")
+    width, height = img.size
+    font_size = max(12, width // 40)
+    margin = font_size // 2
+    font = load_font(font_size)
+
+    measure = ImageDraw.Draw(img)
+    lines = wrap_caption(measure, caption, font, width - 2 * margin)
+    line_height = font_size + font_size // 4
+    band_height = len(lines) * line_height + 2 * margin
+
+    canvas = Image.new("RGB", (width, height + band_height), "white")
+    canvas.paste(img, (0, band_height))
+    draw = ImageDraw.Draw(canvas)
+    for i, line in enumerate(lines):
+        x = max(margin, (width - draw.textlength(line, font=font)) / 2)
+        draw.text((x, margin + i * line_height), line, fill="black", font=font)
+    return canvas
+
+
+def captioned_paths(image_path):
+    """Paths of the captioned image and the caption text written for image_path"""
+    output_dir = os.path.dirname(image_path) or '.'
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return (os.path.join(output_dir, f'{name}_captioned.jpg'),
+            os.path.join(output_dir, f'{name}_caption_data.txt'))
+
+
+def save_captioned_image(img, caption, image_path):
+    """
+    Save the image with its caption overlaid, and the caption text next to it.
+
+    Args:
+        img: PIL Image or RGB numpy array
+        caption: Caption text
+        image_path: Path to original image
+
+    Returns:
+        img_save_path: Path of the captioned image, or None on failure
+    """
+    try:
+        img_save_path, caption_data_path = captioned_paths(image_path)
+        os.makedirs(os.path.dirname(img_save_path), exist_ok=True)
+
+        # Save the caption data separately
+        with open(caption_data_path, 'w') as f:
+            f.write(caption)
+
+        render_caption(img, caption).save(img_save_path, quality=90)
+        print(f"Image saved to {img_save_path}")
+        print(f"Caption data saved to {caption_data_path}")
+        return img_save_path
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error saving captioned image: {str(e)}")
+        return None
+
+
+class CaptionedImageWriter:
+    """
+    Save captioned images on background threads.
+
+    submit() returns as soon as the image is queued, so captioning never
+    waits for rendering or disk writes unless max_pending images are already
+    queued. Call flush() to wait for every queued image, e.g. before exiting.
+    """
+
+    def __init__(self, num_threads=DEFAULT_WRITER_THREADS, max_pending=DEFAULT_MAX_PENDING):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max(1, int(num_threads)),
+                                                               thread_name_prefix="caption-writer")
+        self._slots = threading.BoundedSemaphore(max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def submit(self, img, caption, image_path):
+        """
+        Queue a captioned image for saving.
+
+        Returns:
+            Future resolving to the captioned image path (None on failure)
+        """
+        self._slots.acquire()
+        with self._lock:
+            future = self._executor.submit(save_captioned_image, img, caption, image_path)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def pending(self):
+        """Number of images queued or being written"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """Wait until every image queued so far has been written"""
+        with self._lock:
+            futures = list(self._pending)
+        concurrent.futures.wait(futures, timeout=timeout)
+
+    def close(self):
+        """Write the queued images and stop the writer threads"""
+        self.flush()
+        self._executor.shutdown()
+
+
+# Writer shared by every captioner in the process
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide CaptionedImageWriter, created on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = CaptionedImageWriter()
+        return _writer
+
+
+def flush_writes(timeout=None):
+    """Wait for the captioned images queued on the process-wide writer"""
+    if _writer is not None:
+        _writer.flush(timeout)
@@ -5,36 +5,143 @@ captioning/video.py - Module for converting videos to captions and generating SR
 import cv2
 import os
 import json
-import concurrent.futures
+import math
+import queue
+import threading
 import traceback
 import datetime
 import warnings
 from tqdm import tqdm
-from ..keyframes.extractor import KeyFrameExtractor
-from .image import ImageCaptioner
+from ..keyframes.extractor import KeyFrameExtractor, NATIVE, KATNA
+from ..keyframes.scenes import select_keyframes, keyframe_intervals, iter_shots
+from ..utils.sampling import FrameSampler, AUTO
+from ..utils.decoder import open_video, probe_duration
+from .dedup import FrameDeduplicator
+from .base import create_captioner
+from .engine import ProcessCaptioningEngine
+from .constants import FP32, BEAM, DEFAULT_CONFIDENCE_THRESHOLD, ERROR_CAPTION
 
 # Filter out transformer warnings
 warnings.filterwarnings("ignore", message="Some weights of the model checkpoint.*")
 
+# How the video is split into captioned segments
+KEYFRAMES = "keyframes"
+SHOTS = "shots"
+
+# Shorter side, in pixels, frames are decoded at for captioning. The ViT
+# processor resizes every frame to 224x224, so decoding larger only adds
+# memory traffic.
+DEFAULT_FRAME_SIZE = 224
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v', '.mpg', '.mpeg', '.wmv', '.flv')
+
+
+def is_normalized_link(path):
+    """Whether path is a lowercase-extension symlink left next to a video by normalize_video_path()"""
+    if not os.path.islink(path):
+        return False
+    stem, ext = os.path.splitext(os.path.basename(path))
+    target_stem, target_ext = os.path.splitext(os.path.basename(os.readlink(path)))
+    return target_stem == stem and target_ext != ext and target_ext.lower() == ext
+
+
+def output_stem(video_path):
+    """
+    Path prefix for the output files of a video.
+    
+    This is the video path without its extension, unless another video in
+    the same directory has the same name with a different extension (x.mp4
+    and x.avi); then the extension is kept (x_mp4, x_avi) so their outputs
+    do not overwrite each other. normalize_video_path() symlinks to the same
+    video do not count.
+    """
+    stem, ext = os.path.splitext(video_path)
+    name = os.path.basename(stem)
+    directory = os.path.dirname(video_path) or "."
+    real_path = os.path.realpath(video_path)
+    for filename in os.listdir(directory):
+        other_name, other_ext = os.path.splitext(filename)
+        if other_name != name or other_ext == ext or other_ext.lower() not in VIDEO_EXTENSIONS:
+            continue
+        if os.path.realpath(os.path.join(directory, filename)) != real_path:
+            return f"{stem}_{ext.lstrip('.')}"
+    return stem
+
 class VideoToCaption:
-    def __init__(self, video_path, num_frames=10, verbose=False):
+    def __init__(self, video_path, num_frames=10, verbose=False, batch_size=8, keep_frames=False,
+                 frame_interval=None, queue_size=32, sampling=AUTO, keyframe_backend=NATIVE,
+                 segmentation=KEYFRAMES, dedup_threshold=None, cache=None, workers=1, threads=None,
+                 captioner=None, precision=FP32, onnx_dir=None, decoding=BEAM,
+                 confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD, save_captioned=True, decoder_kwargs=None,
+                 frame_size=DEFAULT_FRAME_SIZE, encoder_cache=None):
         try:
             self.original_video_path = video_path
             self.video_path = self.normalize_video_path(video_path)
             self.num_frames = num_frames
             self.verbose = verbose
+            self.batch_size = max(1, int(batch_size))
+            # Frames are captioned in memory; only write them to disk on request
+            self.keep_frames = keep_frames
+            # Whether kept frames also get a captioned copy, rendered on the background writer
+            self.save_captioned = save_captioned
+            self.frame_paths = []
+            # Sample one frame every frame_interval seconds instead of num_frames in total
+            self.frame_interval = frame_interval
+            # Maximum number of decoded frames buffered ahead of the model in streaming mode
+            self.queue_size = max(1, int(queue_size))
+            # Frame sampling strategy (auto, sequential or seek) and the one actually used
+            self.sampling = sampling
+            self.sampling_strategy = None
+            # open_video() options (backend, threads, hw_accel) used for every decode pass
+            self.decoder_kwargs = decoder_kwargs or {}
+            # Frames are decoded with their shorter side scaled down to frame_size pixels
+            # (None, or keep_frames: source resolution)
+            self.frame_size = frame_size
+            # Keyframe selection: in-package scene scoring (native) or Katna
+            self.keyframe_backend = keyframe_backend
+            # "keyframes" captions num_frames keyframes; "shots" captions one frame per detected shot
+            self.segmentation = segmentation
+            # Frames within dedup_threshold hash bits of a captioned frame reuse its caption (None disables)
+            self.dedup_threshold = dedup_threshold
+            # Optional persistent caption cache passed on to the captioner
+            self.cache = cache
+            # Optional encoder output cache (EncoderCache, True, a directory or its arguments)
+            self.encoder_cache = encoder_cache
+            # Inference precision of the captioner: fp32, int8 or bf16
+            self.precision = precision
+            # Directory of an exported ONNX model to caption with onnxruntime instead of PyTorch
+            self.onnx_dir = onnx_dir
+            # Caption decoding: beam, greedy, or adaptive (greedy with beam search for low-confidence frames)
+            self.decoding = decoding
+            self.confidence_threshold = confidence_threshold
             
-            # Add timestamp to output directories and files
+            # Add timestamp to output directories and files, and a counter if
+            # outputs from the same second already exist
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.frames_dir = os.path.splitext(video_path)[0] + f"_captioning_frames_{timestamp}"
-            self.output_srt = os.path.splitext(video_path)[0] + f"_caption_{timestamp}.srt"
-            self.output_json = os.path.splitext(video_path)[0] + f"_caption_{timestamp}.json"
+            stem = output_stem(video_path)
+            suffix, attempt = timestamp, 0
+            while any(os.path.exists(path) for path in (f"{stem}_captioning_frames_{suffix}",
+                                                        f"{stem}_caption_{suffix}.srt",
+                                                        f"{stem}_caption_{suffix}.json")):
+                attempt += 1
+                suffix = f"{timestamp}_{attempt}"
+            self.frames_dir = f"{stem}_captioning_frames_{suffix}"
+            self.output_srt = f"{stem}_caption_{suffix}.srt"
+            self.output_json = f"{stem}_caption_{suffix}.json"
             
-            os.makedirs(self.frames_dir, exist_ok=True)
+            if self.keep_frames:
+                os.makedirs(self.frames_dir, exist_ok=True)
             self.duration = None  # Initialize duration
+            self.srt_entries = []  # Cues written by the last convert()
             
-            # Create a single captioner instance that will be reused
-            self.captioner = None
+            # Number of captioning processes (1 captions in this process) and torch threads per process
+            self.workers = max(1, int(workers))
+            self.threads = threads
+            
+            # Captioner is created lazily and backed by the shared model registry,
+            # unless one (e.g. a ProcessCaptioningEngine) is passed in and reused
+            self.captioner = captioner
+            self.owns_captioner = captioner is None
         except Exception as e:
             traceback.print_exc()
             raise Exception(f"Error initializing VideoToCaption: {str(e)}")
@@ -64,7 +171,7 @@ class VideoToCaption:
     def extract_frames_katna(self):
         """Extract keyframes using Katna library"""
         try:
-            extractor = KeyFrameExtractor(self.video_path)
+            extractor = KeyFrameExtractor(self.video_path, backend=KATNA)
             output_folder = extractor.extract_key_frames(self.video_path, self.num_frames)
             if output_folder and os.path.exists(output_folder):
                 frames = sorted([os.path.join(output_folder, f) for f in os.listdir(output_folder) if f.endswith('.jpeg')])
@@ -75,48 +182,164 @@ class VideoToCaption:
             print(f"Error extracting frames with katna: {str(e)}")
             return []
 
-    def extract_frames_uniform(self):
-        """Extract frames uniformly across the video duration"""
+    def frame_decoder_kwargs(self, **kwargs):
+        """open_video() options for decoding frames to caption, at frame_size unless they are kept"""
+        # Kept frames are written at the source resolution
+        size = None if self.keep_frames else self.frame_size
+        return dict(self.decoder_kwargs, size=size, **kwargs)
+
+    def probe_duration(self):
+        """Read the video duration in seconds from its metadata"""
+        if self.duration is None:
+            self.duration = probe_duration(self.video_path, **self.decoder_kwargs)
+        return self.duration
+
+    def extract_frames_native(self):
+        """
+        Select keyframes with the in-package scene scorer.
+        
+        Keyframes come with their real timestamps, so each frame is captioned
+        from its own timestamp until the next keyframe's.
+        
+        Returns:
+            List of (frame, start_time, end_time) tuples with RGB frames
+        """
         try:
-            cap = cv2.VideoCapture(self.video_path)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            self.duration = total_frames / fps
-            
-            timestamps = [i * (self.duration / self.num_frames) for i in range(self.num_frames)]
+            keyframes = select_keyframes(self.video_path, self.num_frames, verbose=self.verbose,
+                                         decoder_kwargs=self.frame_decoder_kwargs())
+            self.frame_paths = []
             frames = []
+            for i, (frame, timestamp, _) in enumerate(keyframes):
+                if self.keep_frames:
+                    frame_path = os.path.join(self.frames_dir, f"keyframe_{i:04d}_{timestamp:.3f}s.jpeg")
+                    cv2.imwrite(frame_path, frame)
+                    self.frame_paths.append(frame_path)
+                frames.append((cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), timestamp))
+            return keyframe_intervals(frames, self.probe_duration())
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error extracting frames natively: {str(e)}")
+            return []
+
+    def iter_frames_shots(self):
+        """
+        Detect shots while decoding and yield one representative frame per shot.
+        
+        Yields (frame, start_time, end_time) tuples with RGB frames, where the
+        times are the shot boundaries.
+        """
+        self.frame_paths = []
+        shots = iter_shots(self.video_path, verbose=self.verbose, decoder_kwargs=self.frame_decoder_kwargs())
+        for i, (frame, start_time, end_time) in enumerate(shots):
+            self.duration = end_time
+            if self.keep_frames:
+                frame_path = os.path.join(self.frames_dir, f"shot_{i:04d}_{start_time:.3f}s.jpeg")
+                cv2.imwrite(frame_path, frame)
+                self.frame_paths.append(frame_path)
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), start_time, end_time
+
+    def extract_frames_shots(self):
+        """Extract one representative frame per shot, timed to the shot boundaries"""
+        try:
+            return list(self.iter_frames_shots())
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error detecting shots: {str(e)}")
+            return []
+
+    def sample_count(self):
+        """Number of frames to sample: num_frames, or one per frame_interval seconds"""
+        if self.frame_interval:
+            return max(1, int(math.ceil(self.duration / self.frame_interval)))
+        return self.num_frames
+
+    def iter_frames_uniform(self):
+        """
+        Decode frames uniformly across the video duration, one at a time.
+        
+        Yields (frame, start_time, end_time) tuples where frame is an RGB
+        numpy array decoded at frame_size. When keep_frames is set each frame is also written
+        to frames_dir and its path appended to frame_paths before it is
+        yielded.
+        """
+        decoder = open_video(self.video_path, **self.frame_decoder_kwargs(rgb=True))
+        try:
+            fps = decoder.fps
+            total_frames = decoder.frame_count
+            self.duration = decoder.duration
+            
+            count = self.sample_count()
+            interval = self.duration / count
+            self.frame_paths = []
             
-            for i, timestamp in enumerate(tqdm(timestamps, desc="Extracting frames", disable=not self.verbose)):
-                cap.set(cv2.CAP_PROP_POS_FRAMES, int(fps * timestamp))
-                ret, frame = cap.read()
-                if ret:
+            # Sample with grab()-skipping or keyframe-aware seeking depending on density
+            targets = [min(int(fps * i * interval), max(total_frames - 1, 0)) for i in range(count)]
+            sampler = FrameSampler(decoder, strategy=self.sampling)
+            samples = sampler.sample(targets)
+            i = -1
+            for index, frame in tqdm(samples, total=count, desc="Extracting frames", disable=not self.verbose):
+                if i < 0:
+                    self.sampling_strategy = sampler.strategy
+                    if self.verbose:
+                        print(f"Sampling {count} frames using {sampler.strategy} decoding")
+                # Samples that could not be decoded are skipped, so find this one's slot
+                i += 1
+                while targets[i] != index:
+                    i += 1
+                timestamp = i * interval
+                if self.keep_frames:
                     frame_path = os.path.join(self.frames_dir, f"frame_{i:04d}.jpeg")
-                    cv2.imwrite(frame_path, frame)
-                    frames.append(frame_path)
-            cap.release()
-            return frames
+                    cv2.imwrite(frame_path, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+                    self.frame_paths.append(frame_path)
+                yield frame, timestamp, timestamp + interval
+            if self.verbose:
+                print(f"Frames extracted with {sampler.describe()}")
+        finally:
+            decoder.release()
+
+    def extract_frames_uniform(self):
+        """
+        Extract frames uniformly across the video duration.
+        
+        Frames are returned as decoded RGB numpy arrays so they can be passed
+        straight to the captioner. When keep_frames is set they are also
+        written to frames_dir and their paths recorded in frame_paths.
+        """
+        try:
+            return [frame for frame, _, _ in self.iter_frames_uniform()]
         except Exception as e:
             traceback.print_exc()
             print(f"Error extracting frames uniformly: {str(e)}")
             return []
 
     def extract_frames(self):
-        """Extract frames from video using Katna or uniform sampling"""
+        """Extract frames from video using shots, interval sampling, native keyframes, Katna or uniform sampling"""
         try:
-            # First try to extract frames using Katna
-            frames = self.extract_frames_katna()
-            if not frames:
-                print("No frames extracted by Katna, falling back to uniform extraction.")
+            if self.frame_interval and self.segmentation != SHOTS:
+                # A fixed sampling interval replaces keyframe selection, as in streaming mode
+                return list(self.iter_frames_uniform())
+            if self.segmentation == SHOTS:
+                frames = self.extract_frames_shots()
+                if frames:
+                    return frames
+                print("No shots detected, falling back to uniform extraction.")
+                frames = self.extract_frames_uniform()
+            elif self.keyframe_backend == NATIVE:
+                # Native keyframes carry their real timestamps
+                frames = self.extract_frames_native()
+                if frames:
+                    return frames
+                print("No keyframes selected, falling back to uniform extraction.")
                 frames = self.extract_frames_uniform()
+            else:
+                # First try to extract frames using Katna
+                frames = self.extract_frames_katna()
+                if not frames:
+                    print("No frames extracted by Katna, falling back to uniform extraction.")
+                    frames = self.extract_frames_uniform()
                 
             # Calculate timestamps assuming they are evenly distributed
-            if self.duration is None:
-                cap = cv2.VideoCapture(self.video_path)
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                fps = cap.get(cv2.CAP_PROP_FPS)
-                self.duration = total_frames / fps
-                cap.release()
-                
+            self.probe_duration()
             interval = self.duration / len(frames)
             return [(frame, i * interval, (i + 1) * interval) for i, frame in enumerate(frames)]
         except Exception as e:
@@ -124,29 +347,86 @@ class VideoToCaption:
             print(f"Error extracting frames: {str(e)}")
             return []
 
+    def captioner_options(self):
+        """create_captioner() keyword arguments other than the caption cache"""
+        return {"precision": self.precision, "onnx_dir": self.onnx_dir, "decoding": self.decoding,
+                "confidence_threshold": self.confidence_threshold, "encoder_cache": self.encoder_cache}
+
     def initialize_captioner(self):
         """Initialize the image captioner if not already initialized"""
         if self.captioner is None:
-            self.captioner = ImageCaptioner()
+            if self.workers > 1:
+                # Workers reopen the cache from its path and size limit (see ProcessCaptioningEngine)
+                self.captioner = ProcessCaptioningEngine(
+                    self.workers, self.threads,
+                    captioner_kwargs=dict(self.captioner_options(), cache=self.cache))
+            else:
+                self.captioner = create_captioner(cache=self.cache, **self.captioner_options())
         return self.captioner
 
-    def caption_frame(self, frame_data):
-        """Generate caption for a single frame"""
-        try:
-            frame_path, _, _ = frame_data
-            # Reuse the same captioner instance to avoid loading the model multiple times
-            captioner = self.initialize_captioner()
-            caption = captioner.predict_caption(frame_path)
-            return caption
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error captioning frame: {str(e)}")
-            return "Error generating caption"
+    def release_captioner(self):
+        """Drop a captioner created by this converter, shutting down worker processes"""
+        if self.owns_captioner and self.captioner is not None:
+            if isinstance(self.captioner, ProcessCaptioningEngine):
+                self.captioner.close()
+            # The weights stay in the shared model registry for the next video
+            self.captioner = None
+
+    def dispatch_size(self):
+        """Frames handed to the captioner per call: one batch per worker process"""
+        return self.batch_size * self.workers
+
+    def caption_batch(self, captioner, images, image_paths=None, deduplicator=None):
+        """
+        Caption a batch of frames, skipping inference for near-duplicates.
+        
+        Args:
+            captioner: ImageCaptioner used for the frames that need captioning
+            images: List of frames
+            image_paths: Optional paths used to save captioned images
+            deduplicator: Optional FrameDeduplicator shared across batches
+            
+        Returns:
+            (captions, groups): a caption per frame, and a group id per frame
+            that is shared by near-duplicate frames (unique ids without dedup)
+        """
+        if deduplicator is None:
+            captions = captioner.predict_captions(images, batch_size=self.batch_size,
+                                                  save_image=self.save_captioned, image_paths=image_paths)
+            return captions, [None] * len(images)
+
+        groups, new = [], []
+        for i, image in enumerate(images):
+            group, is_new = deduplicator.assign(image)
+            groups.append(group)
+            if is_new:
+                new.append(i)
+        if new:
+            captions = captioner.predict_captions(
+                [images[i] for i in new], batch_size=self.batch_size, save_image=self.save_captioned,
+                image_paths=[image_paths[i] for i in new] if image_paths else None)
+            for i, caption in zip(new, captions):
+                deduplicator.set_caption(groups[i], caption)
+        if self.verbose and len(new) < len(images):
+            print(f"Skipped {len(images) - len(new)} near-duplicate frames")
+        return [deduplicator.caption(group) for group in groups], groups
 
-    def convert(self):
-        """Convert video to captions and generate SRT file"""
+    def new_deduplicator(self):
+        """Create a deduplicator for one conversion, or None when dedup is disabled"""
+        if self.dedup_threshold is None:
+            return None
+        return FrameDeduplicator(self.dedup_threshold)
+
+    def convert(self, frames=None):
+        """
+        Convert video to captions and generate SRT file
+        
+        Args:
+            frames: Frames already returned by extract_frames(); extracted here when None
+        """
         try:
-            frames = self.extract_frames()
+            if frames is None:
+                frames = self.extract_frames()
             if not frames:
                 print("No frames extracted. Aborting conversion.")
                 return False
@@ -154,26 +434,39 @@ class VideoToCaption:
             srt_entries = []
             
             # Initialize captioner once
-            self.initialize_captioner()
+            captioner = self.initialize_captioner()
             
             print("Generating captions for extracted frames...")
-            # Use a smaller number of workers to prevent memory issues
-            max_workers = min(4, len(frames))
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {executor.submit(self.caption_frame, frame): frame for frame in frames}
-                for future in tqdm(concurrent.futures.as_completed(futures), total=len(frames), 
-                                  desc="Captioning frames", disable=not self.verbose):
-                    frame_path, start_time, end_time = futures[future]
-                    caption = future.result()
-                    srt_entries.append({
-                        'index': frames.index((frame_path, start_time, end_time)) + 1,
-                        'start': self.format_time(start_time),
-                        'end': self.format_time(end_time),
-                        'text': caption
-                    })
-
-            # Sort entries by index
-            srt_entries.sort(key=lambda x: x['index'])
+            # Caption frames in batches with a single model instead of
+            # fanning single frames out to threads contending for it
+            images = [frame for frame, _, _ in frames]
+            # Captioned images are only saved for frames that exist on disk
+            image_paths = self.frame_paths if len(self.frame_paths) == len(images) else None
+            deduplicator = self.new_deduplicator()
+            captions, groups = [], []
+            with tqdm(total=len(frames), desc="Captioning frames", disable=not self.verbose) as progress:
+                step = self.dispatch_size()
+                for start in range(0, len(images), step):
+                    batch = images[start:start + step]
+                    batch_paths = image_paths[start:start + step] if image_paths else None
+                    batch_captions, batch_groups = self.caption_batch(captioner, batch, batch_paths, deduplicator)
+                    captions.extend(batch_captions)
+                    groups.extend(batch_groups)
+                    progress.update(len(batch))
+
+            for i, ((_, start_time, end_time), caption) in enumerate(zip(frames, captions)):
+                # A near-duplicate of the previous frame extends its cue
+                if i > 0 and groups[i] is not None and groups[i] == groups[i - 1]:
+                    srt_entries[-1]['end'] = self.format_time(end_time)
+                    continue
+                srt_entries.append({
+                    'index': len(srt_entries) + 1,
+                    'start': self.format_time(start_time),
+                    'end': self.format_time(end_time),
+                    'text': caption
+                })
+
+            self.srt_entries = srt_entries
             self.save_srt_file(srt_entries)
             self.save_json_file(srt_entries)
             
@@ -185,10 +478,132 @@ class VideoToCaption:
             print(f"Error converting video to captions: {str(e)}")
             return False
         finally:
-            # Clean up resources
-            if self.captioner is not None:
-                del self.captioner
-                self.captioner = None
+            # The weights stay in the shared model registry so the next video does not reload them
+            self.release_captioner()
+
+    def stream_captions(self):
+        """
+        Decode, caption and write SRT cues incrementally.
+        
+        A background thread decodes uniformly sampled frames (or one frame per
+        shot when segmentation is "shots") into a bounded queue; frames are
+        taken off it in micro-batches of up to batch_size per worker,
+        captioned, and each cue is appended to the SRT file and flushed before
+        it is yielded.
+        Memory stays bounded by queue_size frames and the SRT file holds every
+        caption produced so far if the job is interrupted. With dedup enabled
+        a cue is held back until the next different frame arrives, so that
+        near-duplicates can extend it. Katna keyframes are not used in this
+        mode.
+        
+        Yields:
+            SRT entry dicts with index, start, end and text keys
+        """
+        frame_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        end_of_stream = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    frame_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def decode():
+            try:
+                source = self.iter_frames_shots() if self.segmentation == SHOTS else self.iter_frames_uniform()
+                for frame, start_time, end_time in source:
+                    frame_path = self.frame_paths[-1] if self.keep_frames else None
+                    if not put((frame, start_time, end_time, frame_path)):
+                        break
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Error decoding frames: {str(e)}")
+            finally:
+                put(end_of_stream)
+
+        decoder = threading.Thread(target=decode, name="frame-decoder", daemon=True)
+        decoder.start()
+        try:
+            captioner = self.initialize_captioner()
+            deduplicator = self.new_deduplicator()
+            index = 0
+            pending, pending_group = None, None
+            finished = False
+            with open(self.output_srt, 'w') as srt_file:
+                while not finished:
+                    item = frame_queue.get()
+                    if item is end_of_stream:
+                        break
+                    # Block for the first frame, then take whatever else is ready
+                    batch = [item]
+                    while len(batch) < self.dispatch_size():
+                        try:
+                            item = frame_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is end_of_stream:
+                            finished = True
+                            break
+                        batch.append(item)
+
+                    captions, groups = self.caption_batch(
+                        captioner, [frame for frame, _, _, _ in batch],
+                        [frame_path for _, _, _, frame_path in batch], deduplicator)
+                    for (_, start_time, end_time, _), caption, group in zip(batch, captions, groups):
+                        if pending is not None and group is not None and group == pending_group:
+                            pending['end'] = self.format_time(end_time)
+                            continue
+                        if pending is not None:
+                            self.write_srt_entry(srt_file, pending)
+                            srt_file.flush()
+                            yield pending
+                        index += 1
+                        pending, pending_group = {
+                            'index': index,
+                            'start': self.format_time(start_time),
+                            'end': self.format_time(end_time),
+                            'text': caption
+                        }, group
+                        if deduplicator is None:
+                            self.write_srt_entry(srt_file, pending)
+                            srt_file.flush()
+                            yield pending
+                            pending = None
+                if pending is not None:
+                    self.write_srt_entry(srt_file, pending)
+                    srt_file.flush()
+                    yield pending
+        finally:
+            stop.set()
+            decoder.join(timeout=5)
+            self.release_captioner()
+
+    def convert_streaming(self):
+        """Convert video to captions in streaming mode and generate SRT and JSON files"""
+        try:
+            srt_entries = []
+            print("Streaming captions for sampled frames...")
+            for entry in self.stream_captions():
+                srt_entries.append(entry)
+                if self.verbose:
+                    print(f"[{entry['start']} --> {entry['end']}] {entry['text']}")
+
+            if not srt_entries:
+                print("No frames extracted. Aborting conversion.")
+                return False
+
+            self.save_json_file(srt_entries)
+            print(f"Conversion complete. SRT file saved to {self.output_srt}")
+            print(f"JSON file saved to {self.output_json}")
+            return True
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error converting video to captions: {str(e)}")
+            return False
 
     def format_time(self, seconds):
         """Format time in SRT format: HH:MM:SS,mmm"""
@@ -206,13 +621,17 @@ class VideoToCaption:
         try:
             with open(self.output_srt, 'w') as file:
                 for entry in srt_entries:
-                    file.write(f"{entry['index']}\n")
-                    file.write(f"{entry['start']} --> {entry['end']}\n")
-                    file.write(f"{entry['text']}\n\n")
+                    self.write_srt_entry(file, entry)
         except Exception as e:
             traceback.print_exc()
             print(f"Error saving SRT file: {str(e)}")
 
+    def write_srt_entry(self, file, entry):
+        """Write a single SRT cue to an open file"""
+        file.write(f"{entry['index']}\n")
+        file.write(f"{entry['start']} --> {entry['end']}\n")
+        file.write(f"{entry['text']}\n\n")
+
     def save_json_file(self, srt_entries):
         """Save captions in JSON format"""
         try:
@@ -6,13 +6,11 @@ import argparse
 import os
 import sys
 import traceback
-import cv2
 import warnings
-from .keyframes.extractor import KeyFrameExtractor
-from .keyframes.matcher import VideoKeyframeMatcher
-from .captioning.image import ImageCaptioner
-from .captioning.video import VideoToCaption
-from .utils.visualization import visualize_keyframes, visualize_timeline
+# Only the standard library is needed to build the parser; each subcommand
+# imports what it uses, so --help and find-timestamps never load torch
+from .captioning.cache import DEFAULT_CACHE_PATH
+from .captioning.constants import DEFAULT_MODEL_NAME
 
 # Filter out transformer warnings
 warnings.filterwarnings("ignore", message="Some weights of the model checkpoint.*")
@@ -20,7 +18,10 @@ warnings.filterwarnings("ignore", message="Some weights of the model checkpoint.
 def extract_keyframes(args):
     """Extract keyframes from a video"""
     try:
-        extractor = KeyFrameExtractor(args.video_path)
+        from .keyframes.extractor import KeyFrameExtractor
+        from .utils.visualization import visualize_keyframes
+        
+        extractor = KeyFrameExtractor(args.video_path, backend=args.backend, decoder_kwargs=decoder_options(args))
         output_folder = extractor.extract_key_frames(args.video_path, args.num_key_frames)
         
         if output_folder and os.path.exists(output_folder) and args.visualize:
@@ -32,48 +33,229 @@ def extract_keyframes(args):
         print(f"Error extracting keyframes: {str(e)}")
         sys.exit(1)
 
+def add_decoder_arguments(parser):
+    """Add the video decoder options to a subcommand parser"""
+    parser.add_argument("--decoder", choices=["opencv", "pyav"], default="opencv",
+                        help="Video decoder: OpenCV, or PyAV with threaded decoding and scaled output (pip install vit-captioner[pyav])")
+    parser.add_argument("--decode_threads", type=int, default=None, help="Decoder threads (default: chosen by the decoder)")
+    parser.add_argument("--hw_decode", action="store_true", help="Request hardware-accelerated decoding (OpenCV FFmpeg backend)")
+
+def decoder_options(args):
+    """open_video() keyword arguments from the decoder options"""
+    return {"backend": args.decoder, "threads": args.decode_threads, "hw_accel": args.hw_decode}
+
+def open_cache(args):
+    """Open the caption cache requested with --cache, if any"""
+    if args.cache is None:
+        return None
+    from .captioning.cache import CaptionCache
+    return CaptionCache(args.cache, max_bytes=int(args.cache_size * 1024 * 1024))
+
+def encoder_cache_options(args):
+    """EncoderCache keyword arguments requested with --encoder_cache, if any"""
+    if args.encoder_cache is None:
+        return None
+    return {"max_items": args.encoder_cache_items, "spill_dir": args.encoder_cache or None}
+
+def add_cache_arguments(parser):
+    """Add the caption cache options to a subcommand parser"""
+    parser.add_argument("--cache", type=str, nargs="?", const=DEFAULT_CACHE_PATH, default=None, metavar="PATH",
+                        help=f"Reuse captions from an on-disk cache (default path when given: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache_size", type=float, default=256, help="Maximum cache size in MB (default: 256)")
+    parser.add_argument("--encoder_cache", type=str, nargs="?", const="", default=None, metavar="DIR",
+                        help="Cache ViT encoder outputs in memory, and in DIR when given, so re-captioning the same frames "
+                             "with other decoding settings only runs the decoder (PyTorch backend only)")
+    parser.add_argument("--encoder_cache_items", type=int, default=1024,
+                        help="Encoder outputs kept in memory (default: 1024)")
+
+def add_precision_argument(parser):
+    """Add the inference precision option to a subcommand parser"""
+    parser.add_argument("--precision", choices=["fp32", "int8", "bf16"], default="fp32",
+                        help="Inference precision: fp32, dynamic int8 quantization (CPU) or bfloat16 autocast (default: fp32)")
+
+def add_onnx_argument(parser):
+    """Add the ONNX backend option to a subcommand parser"""
+    parser.add_argument("--onnx", type=str, default=None, metavar="DIR",
+                        help="Caption with onnxruntime using a model exported by export-onnx to DIR (ignores --precision)")
+
+def add_decoding_arguments(parser):
+    """Add the caption decoding options to a subcommand parser"""
+    parser.add_argument("--decoding", choices=["beam", "greedy", "adaptive"], default="beam",
+                        help="Caption decoding: beam search, greedy, or greedy with beam search for low-confidence captions (default: beam)")
+    parser.add_argument("--confidence", type=float, default=0.3,
+                        help="Adaptive decoding re-decodes captions whose least likely token is below this probability (default: 0.3)")
+
 def caption_image(args):
     """Generate caption for an image"""
     try:
-        captioner = ImageCaptioner()
-        caption = captioner.predict_caption(args.image_path, save_image=True)
+        from .captioning.base import create_captioner
+        from .captioning.render import flush_writes
+        
+        captioner = create_captioner(cache=open_cache(args), precision=args.precision, onnx_dir=args.onnx,
+                                     decoding=args.decoding, confidence_threshold=args.confidence,
+                                     encoder_cache=encoder_cache_options(args))
+        caption = captioner.predict_caption(args.image_path, save_image=not args.no_save)
         print(f"Caption: {caption}")
+        # The captioned image is written in the background
+        flush_writes()
     except Exception as e:
         traceback.print_exc()
         print(f"Error captioning image: {str(e)}")
         sys.exit(1)
 
+def add_video_caption_arguments(parser):
+    """Add the options shared by caption-video and caption-videos to a subcommand parser"""
+    parser.add_argument("-N", "--num_frames", type=int, default=10, help="Number of frames to caption")
+    parser.add_argument("-B", "--batch_size", type=int, default=8, help="Number of frames captioned per model call")
+    parser.add_argument("--keep_frames", action="store_true", help="Also write sampled frames and captioned images to disk")
+    parser.add_argument("--no_captioned", action="store_true", help="With --keep_frames, write the frames without captioned copies")
+    parser.add_argument("--frame_size", type=int, default=224,
+                        help="Decode frames with their shorter side scaled down to this many pixels; 0 keeps the source resolution, "
+                             "as does --keep_frames (default: 224)")
+    parser.add_argument("--interval", type=float, default=None, help="Sample one frame every INTERVAL seconds instead of selecting -N keyframes (not used with --shots)")
+    parser.add_argument("--shots", action="store_true",
+                        help="Caption one frame per detected shot, timed to the shot boundaries (ignores -N)")
+    parser.add_argument("--dedup", type=int, nargs="?", const=4, default=None, metavar="BITS",
+                        help="Reuse the previous caption for frames within BITS perceptual-hash bits of it and of similar colour (default when given: 4)")
+    parser.add_argument("--keyframe_backend", choices=["native", "katna"], default="native",
+                        help="Keyframe selector: in-package OpenCV scene scoring or Katna")
+    parser.add_argument("--sampling", choices=["auto", "sequential", "seek"], default="auto",
+                        help="Frame sampling strategy: grab() through the stream, seek, or pick by sample density")
+    add_decoder_arguments(parser)
+    add_cache_arguments(parser)
+    add_precision_argument(parser)
+    add_onnx_argument(parser)
+    add_decoding_arguments(parser)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of captioning processes, each with its own model copy (default: 1)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch intra-op threads per worker process (default: cores / workers)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
+
+def video_caption_options(args):
+    """VideoToCaption keyword arguments from the shared video captioning options"""
+    return dict(num_frames=args.num_frames, verbose=args.verbose, batch_size=args.batch_size,
+                keep_frames=args.keep_frames, save_captioned=not args.no_captioned,
+                frame_size=args.frame_size or None, frame_interval=args.interval, sampling=args.sampling,
+                keyframe_backend=args.keyframe_backend,
+                segmentation="shots" if args.shots else "keyframes",
+                dedup_threshold=args.dedup, cache=open_cache(args), encoder_cache=encoder_cache_options(args),
+                workers=args.workers, threads=args.threads, precision=args.precision,
+                onnx_dir=args.onnx, decoding=args.decoding, confidence_threshold=args.confidence,
+                decoder_kwargs=decoder_options(args))
+
 def caption_video(args):
     """Convert video to captions and generate SRT file"""
     try:
-        # Pass the verbose flag to the converter
-        converter = VideoToCaption(args.video_path, num_frames=args.num_frames, verbose=args.verbose)
-        converter.convert()
+        from .captioning.video import VideoToCaption
+        from .captioning.render import flush_writes
+        
+        converter = VideoToCaption(args.video_path, **video_caption_options(args))
+        if args.stream:
+            converter.convert_streaming()
+        else:
+            converter.convert()
+        flush_writes()
     except Exception as e:
         traceback.print_exc()
         print(f"Error captioning video: {str(e)}")
         sys.exit(1)
 
+def caption_videos(args):
+    """Caption every video in directories, globs or manifests with one loaded model"""
+    try:
+        from .captioning.batch import BatchVideoCaptioner, collect_videos
+        
+        video_paths = collect_videos(args.inputs)
+        print(f"Found {len(video_paths)} videos to caption")
+        summary = BatchVideoCaptioner(video_paths, summary_path=args.summary, **video_caption_options(args)).run()
+        if any(entry["status"] != "ok" for entry in summary):
+            sys.exit(1)
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error captioning videos: {str(e)}")
+        sys.exit(1)
+
+def serve(args):
+    """Serve captions over a local HTTP API with a resident model"""
+    try:
+        from .server import CaptionServer
+        
+        server = CaptionServer(args.host, args.port, max_batch_size=args.max_batch_size,
+                               max_wait_ms=args.max_wait_ms, cache=open_cache(args),
+                               precision=args.precision, onnx_dir=args.onnx, decoding=args.decoding,
+                               confidence_threshold=args.confidence, encoder_cache=encoder_cache_options(args),
+                               verbose=args.verbose)
+        server.serve_forever()
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error running caption server: {str(e)}")
+        sys.exit(1)
+
+def export_onnx(args):
+    """Export the captioning model to ONNX for the onnxruntime backend"""
+    try:
+        from .captioning.onnx_export import export_onnx as export
+        
+        if export(args.output_dir, model_name=args.model, opset=args.opset) is None:
+            sys.exit(1)
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error exporting ONNX model: {str(e)}")
+        sys.exit(1)
+
+def index_video(args):
+    """Index every frame of a video for instant keyframe timestamp lookups"""
+    try:
+        from .keyframes.index import VideoIndex, default_index_path
+        
+        index = VideoIndex(args.output or default_index_path(args.video_path))
+        if not args.force and index.is_valid(args.video_path):
+            print(f"Index {index.path} is up to date")
+            return
+        count = index.build(args.video_path, decoder_kwargs=decoder_options(args))
+        print(f"Indexed {count} frames to {index.path}")
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Error indexing video: {str(e)}")
+        sys.exit(1)
+
 def find_timestamps(args):
     """Find matching timestamps for keyframes"""
     try:
-        matcher = VideoKeyframeMatcher(args.video_path, args.keyframes_folder)
-        if matcher.load_video_to_array():
+        from .keyframes.matcher import VideoKeyframeMatcher
+        from .keyframes.frame_store import default_store_path
+        from .keyframes.index import open_index
+        from .utils.decoder import probe_duration
+        from .utils.visualization import visualize_timeline
+        
+        matcher = VideoKeyframeMatcher(args.video_path, args.keyframes_folder, coarse_fps=args.coarse_fps,
+                                       decoder_kwargs=decoder_options(args))
+        if args.index is not None:
+            # Look the keyframes up in the video's signature index, building it on first use
+            index = open_index(args.video_path, args.index or None, decoder_kwargs=decoder_options(args))
+            results = matcher.process_keyframes(index=index)
+        elif args.coarse_to_fine:
+            results = matcher.process_keyframes(coarse_to_fine=True)
+        # By default the video is streamed in a single pass; --in_memory decodes it into RAM first
+        # and --frame_store decodes it to disk once and memory-maps it on later runs
+        elif args.frame_store is not None or args.in_memory:
+            store_path = None
+            if args.frame_store is not None:
+                store_path = args.frame_store or default_store_path(args.video_path, matcher.match_size)
+            results = matcher.process_keyframes() if matcher.load_video_to_array(store_path) else []
+        else:
             results = matcher.process_keyframes()
+
+        if results and args.visualize:
+            # Extract video duration
+            duration = probe_duration(args.video_path, **decoder_options(args))
             
-            if results and args.visualize:
-                # Extract video duration
-                cap = cv2.VideoCapture(args.video_path)
-                fps = cap.get(cv2.CAP_PROP_FPS)
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                duration = total_frames / fps
-                cap.release()
-                
-                # Extract timestamps and captions (using filenames as captions for now)
-                timestamps = [t for _, t, _ in results if t >= 0]
-                captions = [os.path.basename(p) for p, t, _ in results if t >= 0]
-                
-                visualize_timeline(timestamps, captions, duration)
+            # Extract timestamps and captions (using filenames as captions for now)
+            timestamps = [t for _, t, _ in results if t >= 0]
+            captions = [os.path.basename(p) for p, t, _ in results if t >= 0]
+            
+            visualize_timeline(timestamps, captions, duration)
     except Exception as e:
         traceback.print_exc()
         print(f"Error finding timestamps: {str(e)}")
@@ -89,24 +271,75 @@ def main():
     extract_parser = subparsers.add_parser("extract", help="Extract keyframes from a video")
     extract_parser.add_argument("-V", "--video_path", type=str, required=True, help="Path to the video file")
     extract_parser.add_argument("-N", "--num_key_frames", type=int, default=7, help="Number of key frames to extract")
+    extract_parser.add_argument("--backend", choices=["native", "katna"], default="native",
+                                help="Keyframe selector: in-package OpenCV scene scoring or Katna")
+    add_decoder_arguments(extract_parser)
     extract_parser.add_argument("-v", "--visualize", action="store_true", help="Visualize the extracted keyframes")
     
     # Parser for the caption-image command
     caption_image_parser = subparsers.add_parser("caption-image", help="Generate caption for an image")
     caption_image_parser.add_argument("-I", "--image_path", type=str, required=True, help="Path to the image file")
+    caption_image_parser.add_argument("--no_save", action="store_true", help="Only print the caption, do not write the captioned image")
+    add_cache_arguments(caption_image_parser)
+    add_precision_argument(caption_image_parser)
+    add_onnx_argument(caption_image_parser)
+    add_decoding_arguments(caption_image_parser)
     
     # Parser for the caption-video command
     caption_video_parser = subparsers.add_parser("caption-video", help="Convert video to captions")
     caption_video_parser.add_argument("-V", "--video_path", type=str, required=True, help="Path to the video file")
-    caption_video_parser.add_argument("-N", "--num_frames", type=int, default=10, help="Number of frames to caption")
-    caption_video_parser.add_argument("-v", "--verbose", action="store_true", help="Show verbose output")
+    caption_video_parser.add_argument("--stream", action="store_true", help="Decode, caption and write SRT cues incrementally (for long videos)")
+    add_video_caption_arguments(caption_video_parser)
+    
+    # Parser for the caption-videos command
+    caption_videos_parser = subparsers.add_parser("caption-videos", help="Caption many videos with one loaded model")
+    caption_videos_parser.add_argument("-I", "--inputs", type=str, nargs="+", required=True,
+                                       help="Video files, directories, glob patterns or manifest files (.txt/.lst/.json)")
+    caption_videos_parser.add_argument("-o", "--summary", type=str, default=None,
+                                       help="Path of the per-video summary JSON (default: caption_summary_<timestamp>.json)")
+    add_video_caption_arguments(caption_videos_parser)
     
     # Parser for the find-timestamps command
     find_timestamps_parser = subparsers.add_parser("find-timestamps", help="Find matching timestamps for keyframes")
     find_timestamps_parser.add_argument("-V", "--video_path", type=str, required=True, help="Path to the video file")
     find_timestamps_parser.add_argument("-K", "--keyframes_folder", type=str, required=True, help="Path to the keyframes folder")
+    find_timestamps_parser.add_argument("--in_memory", action="store_true", help="Load the whole video into memory before matching")
+    find_timestamps_parser.add_argument("--frame_store", type=str, nargs="?", const="", default=None, metavar="DIR",
+                                        help="Decode the video once into a memory-mapped frame store and reuse it on later runs "
+                                             "(default when given: <video>_frames_<width>x<height> next to the video)")
+    find_timestamps_parser.add_argument("--coarse_to_fine", action="store_true", help="Match on a low-resolution subsampled pass, then refine around the best candidates")
+    find_timestamps_parser.add_argument("--coarse_fps", type=float, default=2.0, help="Sampling rate of the coarse pass (default: 2)")
+    find_timestamps_parser.add_argument("--index", type=str, nargs="?", const="", default=None, metavar="DIR",
+                                        help="Look keyframes up in the video's index built by the index command, building it if needed "
+                                             "(default when given: <video>_index next to the video)")
+    add_decoder_arguments(find_timestamps_parser)
     find_timestamps_parser.add_argument("-v", "--visualize", action="store_true", help="Visualize the timestamps on a timeline")
     
+    # Parser for the index command
+    index_parser = subparsers.add_parser("index", help="Index every frame of a video for instant timestamp lookups")
+    index_parser.add_argument("-V", "--video_path", type=str, required=True, help="Path to the video file")
+    index_parser.add_argument("-o", "--output", type=str, default=None, help="Index directory (default: <video>_index next to the video)")
+    index_parser.add_argument("--force", action="store_true", help="Rebuild the index even if it is up to date")
+    add_decoder_arguments(index_parser)
+    
+    # Parser for the serve command
+    serve_parser = subparsers.add_parser("serve", help="Serve captions over a local HTTP API")
+    serve_parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    serve_parser.add_argument("--max_batch_size", type=int, default=16, help="Maximum number of images per batched generate call (default: 16)")
+    serve_parser.add_argument("--max_wait_ms", type=float, default=5, help="How long to wait for more requests before captioning a batch (default: 5)")
+    add_cache_arguments(serve_parser)
+    add_precision_argument(serve_parser)
+    add_onnx_argument(serve_parser)
+    add_decoding_arguments(serve_parser)
+    serve_parser.add_argument("-v", "--verbose", action="store_true", help="Log requests")
+    
+    # Parser for the export-onnx command
+    export_onnx_parser = subparsers.add_parser("export-onnx", help="Export the captioning model to ONNX")
+    export_onnx_parser.add_argument("-o", "--output_dir", type=str, required=True, help="Directory to write the ONNX model to")
+    export_onnx_parser.add_argument("--model", type=str, default=DEFAULT_MODEL_NAME, help=f"Model name or local path (default: {DEFAULT_MODEL_NAME})")
+    export_onnx_parser.add_argument("--opset", type=int, default=17, help="ONNX opset version (default: 17)")
+    
     # Parse the arguments
     args = parser.parse_args()
     
@@ -117,8 +350,16 @@ def main():
         caption_image(args)
     elif args.command == "caption-video":
         caption_video(args)
+    elif args.command == "caption-videos":
+        caption_videos(args)
+    elif args.command == "serve":
+        serve(args)
+    elif args.command == "export-onnx":
+        export_onnx(args)
     elif args.command == "find-timestamps":
         find_timestamps(args)
+    elif args.command == "index":
+        index_video(args)
     else:
         parser.print_help()
         sys.exit(1)
@@ -2,7 +2,17 @@
 Keyframes extraction and matching module
 """
 
-from .extractor import KeyFrameExtractor
-from .matcher import VideoKeyframeMatcher
+from ..utils.lazy import lazy_exports
 
-__all__ = ['KeyFrameExtractor', 'VideoKeyframeMatcher']
\ No newline at end of file
+_EXPORTS = {
+    'KeyFrameExtractor': '.extractor',
+    'VideoKeyframeMatcher': '.matcher',
+    'select_keyframes': '.scenes',
+    'FrameStore': '.frame_store',
+    'VideoIndex': '.index',
+}
+
+__all__ = list(_EXPORTS)
+
+# Exports are imported on first access so importing the package stays cheap
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -2,15 +2,19 @@
 keyframes/extractor.py - Module for extracting keyframes from videos
 """
 
-from Katna.video import Video
-from Katna.writer import KeyFrameDiskWriter
 import os
 import argparse
 import datetime
 import traceback
+import cv2
+from .scenes import select_keyframes, HISTOGRAM
+
+NATIVE = "native"
+KATNA = "katna"
+BACKENDS = (NATIVE, KATNA)
 
 class KeyFrameExtractor:
-    def __init__(self, video_path):
+    def __init__(self, video_path, backend=NATIVE, method=HISTOGRAM, decoder_kwargs=None):
         # Determine the base directory and filename of the video
         base_dir = os.path.dirname(video_path)
         filename = os.path.splitext(os.path.basename(video_path))[0]
@@ -18,11 +22,55 @@ class KeyFrameExtractor:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         self.output_folder = os.path.join(base_dir, f"{filename}_key_frame_output_{timestamp}")
         
+        # Keyframe backend: in-package OpenCV scene scoring, or the Katna library
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown keyframe backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.method = method
+        # open_video() options (backend, threads, hw_accel) of the native backend's decoder
+        self.decoder_kwargs = decoder_kwargs
+        # (path, timestamp, score) for each keyframe written by the native backend
+        self.keyframes = []
+        
         # Ensure the output directory exists
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
 
     def extract_key_frames(self, video_path, num_key_frames):
+        """
+        Extract key frames from a video file and save them to the output folder.
+        
+        Args:
+            video_path: Path to the video file
+            num_key_frames: Number of key frames to extract
+            
+        Returns:
+            output_folder: Path to the folder containing extracted keyframes
+        """
+        if self.backend == KATNA:
+            return self.extract_key_frames_katna(video_path, num_key_frames)
+        try:
+            self.keyframes = []
+            selected = select_keyframes(video_path, num_key_frames, method=self.method, decoder_kwargs=self.decoder_kwargs)
+            for i, (frame, timestamp, score) in enumerate(selected):
+                frame_path = os.path.join(self.output_folder, f"keyframe_{i:04d}_{timestamp:.3f}s.jpeg")
+                cv2.imwrite(frame_path, frame)
+                self.keyframes.append((frame_path, timestamp, score))
+            
+            # Save the real timestamps next to the frames
+            timestamps_path = os.path.join(self.output_folder, "keyframe_timestamps.csv")
+            with open(timestamps_path, 'w') as f:
+                f.write("Keyframe,Timestamp (seconds)\n")
+                for frame_path, timestamp, _ in self.keyframes:
+                    f.write(f"{os.path.basename(frame_path)},{timestamp:.3f}\n")
+            print(f"Key frames extracted and saved in the folder: {self.output_folder}")
+            return self.output_folder
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error extracting key frames: {str(e)}")
+            return None
+
+    def extract_key_frames_katna(self, video_path, num_key_frames):
         """
         Extract key frames from a video file using Katna library.
         
@@ -33,6 +81,13 @@ class KeyFrameExtractor:
         Returns:
             output_folder: Path to the folder containing extracted keyframes
         """
+        try:
+            # Katna is optional and slow to import, so only load it when requested
+            from Katna.video import Video
+            from Katna.writer import KeyFrameDiskWriter
+        except ImportError:
+            print("Katna is not installed. Install it with: pip install vit-captioner[katna]")
+            return None
         try:
             # Initialize video processing module
             video_processor = Video()
@@ -49,4 +104,4 @@ class KeyFrameExtractor:
         except Exception as e:
             traceback.print_exc()
             print(f"Error extracting key frames: {str(e)}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,103 @@
+"""
+keyframes/frame_store.py - On-disk store of downscaled grayscale frames, opened as a memory map
+"""
+
+import os
+import json
+import numpy as np
+
+HEADER_FILE = "header.json"
+FRAMES_FILE = "frames.u8"
+STORE_VERSION = 1
+
+
+def default_store_path(video_path, frame_size):
+    """Frame store path next to the video, named after the frame size"""
+    width, height = frame_size
+    return f"{os.path.splitext(video_path)[0]}_frames_{width}x{height}"
+
+
+def video_signature(video_path):
+    """Size and modification time of the video, used to detect a changed source"""
+    stat = os.stat(video_path)
+    # Nanoseconds, so a video rewritten at the same size within a second is still detected
+    return {"video_bytes": stat.st_size, "video_mtime_ns": stat.st_mtime_ns}
+
+
+class FrameStore:
+    """
+    Grayscale frames of one video at one resolution, stored once and memory-mapped on later runs.
+
+    A store is a directory holding the raw uint8 frames and a small JSON
+    header with the frame rate, shape and the size and modification time of
+    the source video. The header is written last, so an interrupted build is
+    never opened, and a store built from another video, or whose video has
+    changed, is rebuilt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header_path = os.path.join(path, HEADER_FILE)
+        self.frames_path = os.path.join(path, FRAMES_FILE)
+
+    def read_header(self):
+        """Header of a complete store, or None"""
+        try:
+            with open(self.header_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self, video_path, frame_size):
+        """Whether the store holds frames of this video, unchanged, at frame_size"""
+        header = self.read_header()
+        if header is None or header.get("version") != STORE_VERSION:
+            return False
+        width, height = frame_size
+        return header["shape"][1:] == [height, width] and header.get("video_path") == os.path.abspath(video_path) and \
+            all(header.get(key) == value for key, value in video_signature(video_path).items())
+
+    def open(self):
+        """
+        Memory-map the stored frames.
+
+        Returns:
+            (frames, fps): read-only uint8 memmap of shape (frames, height, width) and the frame rate
+        """
+        header = self.read_header()
+        if header is None:
+            raise Exception(f"No frame store at {self.path}")
+        shape = tuple(header["shape"])
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=np.uint8), header["fps"]
+        return np.memmap(self.frames_path, dtype=np.uint8, mode="r", shape=shape), header["fps"]
+
+    def build(self, frames, video_path, fps, frame_size):
+        """
+        Write frames to the store, replacing a previous build.
+
+        Args:
+            frames: Iterable of 2D uint8 frames of frame_size (width, height)
+            video_path: Source video, recorded to detect later changes
+            fps: Frame rate of the video
+            frame_size: (width, height) of the frames
+
+        Returns:
+            Number of frames written
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # Invalidate the old store first; the new header is only written once every frame is on disk
+        if os.path.exists(self.header_path):
+            os.remove(self.header_path)
+        width, height = frame_size
+        count = 0
+        with open(self.frames_path, "wb") as f:
+            for frame in frames:
+                f.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+                count += 1
+        header = {"version": STORE_VERSION, "video_path": os.path.abspath(video_path), "fps": fps,
+                  "shape": [count, height, width], "dtype": "uint8"}
+        header.update(video_signature(video_path))
+        with open(self.header_path, "w") as f:
+            json.dump(header, f, indent=4)
+        return count
@@ -0,0 +1,166 @@
+"""
+keyframes/index.py - Temporal index of per-frame signatures for instant keyframe timestamp lookup
+"""
+
+import os
+import cv2
+import numpy as np
+from tqdm import tqdm
+from ..utils.decoder import open_video
+from ..utils.image_hash import thumbnail_hashes, hamming_distances
+from .frame_store import FrameStore
+
+HASHES_FILE = "hashes.u64"
+# Thumbnail size frames are indexed at: 576 bytes per frame, about 62 MB per hour at 30 fps
+DEFAULT_INDEX_SIZE = (32, 18)
+# Frames within this many hash bits of a keyframe's nearest frame are rescored by correlation
+DEFAULT_HASH_MARGIN = 8
+DEFAULT_MAX_CANDIDATES = 4096
+
+
+def default_index_path(video_path):
+    """Index path next to the video"""
+    return f"{os.path.splitext(video_path)[0]}_index"
+
+
+def thumbnail_hashes(thumbnails):
+    """
+    Compute 64-bit difference hashes of grayscale thumbnails.
+
+    Each thumbnail is reduced to 9x8 pixels and each bit records whether a
+    pixel is brighter than its right-hand neighbour, like dedup.dhash().
+
+    Returns:
+        uint64 array with one hash per thumbnail
+    """
+    if not len(thumbnails):
+        return np.zeros(0, dtype=np.uint64)
+    small = np.stack([cv2.resize(thumbnail, (9, 8), interpolation=cv2.INTER_AREA) for thumbnail in thumbnails])
+    small = small.astype(np.int16)
+    bits = (small[:, :, 1:] > small[:, :, :-1]).reshape(len(small), 64)
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def normalize_thumbnails(thumbnails):
+    """Flatten thumbnails to zero-mean, unit-norm float32 rows, so dot products are correlations"""
+    vectors = np.asarray(thumbnails, dtype=np.float32).reshape(len(thumbnails), -1)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+    return vectors
+
+
+class VideoIndex:
+    """
+    Per-frame signatures of one video: a 64-bit difference hash and a small
+    grayscale thumbnail for every frame.
+
+    The thumbnails are kept in a FrameStore and the hashes in a raw uint64
+    file next to it, and both are memory-mapped when the index is opened. A
+    lookup ranks every frame by Hamming distance to the keyframe's hash and
+    rescores the closest ones by thumbnail correlation, so no video is decoded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.store = FrameStore(path)
+        self.hashes_path = os.path.join(path, HASHES_FILE)
+        self.hashes = None
+        self.thumbnails = None
+        self.fps = None
+        self.size = None
+
+    def is_valid(self, video_path, size=DEFAULT_INDEX_SIZE):
+        """Whether the index is complete and was built from this video, unchanged, at size"""
+        if not self.store.is_valid(video_path, size):
+            return False
+        frames = self.store.read_header()["shape"][0]
+        return os.path.exists(self.hashes_path) and os.path.getsize(self.hashes_path) == frames * 8
+
+    def build(self, video_path, size=DEFAULT_INDEX_SIZE, decoder_kwargs=None, verbose=True):
+        """
+        Decode the video once and index every frame.
+
+        Args:
+            video_path: Path to the video file
+            size: (width, height) of the thumbnails
+            decoder_kwargs: open_video() options (backend, threads, hw_accel)
+            verbose: Show a progress bar
+
+        Returns:
+            Number of indexed frames
+        """
+        size = tuple(size)
+        hashes = []
+        with open_video(video_path, size=size, gray=True, **(decoder_kwargs or {})) as decoder:
+            fps = decoder.fps
+
+            def thumbnails():
+                for _ in tqdm(range(decoder.frame_count), desc="Indexing frames", disable=not verbose):
+                    ret, thumbnail = decoder.read()
+                    if not ret:
+                        break
+                    hashes.append(thumbnail_hashes([thumbnail])[0])
+                    yield thumbnail
+
+            # The hashes are written after the store, so a partial build fails is_valid()
+            if os.path.exists(self.hashes_path):
+                os.remove(self.hashes_path)
+            count = self.store.build(thumbnails(), video_path, fps, size)
+        np.array(hashes, dtype=np.uint64).tofile(self.hashes_path)
+        return count
+
+    def open(self):
+        """Memory-map the hashes and thumbnails"""
+        self.thumbnails, self.fps = self.store.open()
+        self.size = (self.thumbnails.shape[2], self.thumbnails.shape[1])
+        count = self.thumbnails.shape[0]
+        self.hashes = np.memmap(self.hashes_path, dtype=np.uint64, mode="r") if count else \
+            np.zeros(0, dtype=np.uint64)
+        return self
+
+    def __len__(self):
+        return 0 if self.hashes is None else len(self.hashes)
+
+    def lookup(self, keyframe, hash_margin=DEFAULT_HASH_MARGIN, max_candidates=DEFAULT_MAX_CANDIDATES):
+        """
+        Find the frame that best matches a keyframe.
+
+        Args:
+            keyframe: 2D grayscale keyframe at any resolution
+            hash_margin: Frames within this many bits of the nearest hash are rescored
+            max_candidates: Maximum number of frames rescored by correlation
+
+        Returns:
+            (frame_index, correlation), or (-1, -1) for an empty index
+        """
+        if not len(self):
+            return -1, -1
+        thumbnail = cv2.resize(keyframe, self.size, interpolation=cv2.INTER_AREA)
+        distances = hamming_distances(np.asarray(self.hashes), thumbnail_hashes([thumbnail])[0])
+        candidates = np.flatnonzero(distances <= distances.min() + hash_margin)
+        if len(candidates) > max_candidates:
+            closest = np.argpartition(distances[candidates], max_candidates - 1)[:max_candidates]
+            candidates = np.sort(candidates[closest])
+        scores = normalize_thumbnails(self.thumbnails[candidates]) @ normalize_thumbnails([thumbnail])[0]
+        best = int(scores.argmax())
+        return int(candidates[best]), float(scores[best])
+
+
+def open_index(video_path, path=None, decoder_kwargs=None, verbose=True):
+    """
+    Open the index of a video, building it first when it is missing or stale.
+
+    Args:
+        video_path: Path to the video file
+        path: Index directory (default: next to the video)
+        decoder_kwargs: open_video() options used if the index is built
+        verbose: Show a progress bar while building
+
+    Returns:
+        Opened VideoIndex
+    """
+    index = VideoIndex(path or default_index_path(video_path))
+    if not index.is_valid(video_path):
+        count = index.build(video_path, decoder_kwargs=decoder_kwargs, verbose=verbose)
+        print(f"Indexed {count} frames to {index.path}")
+    return index.open()
@@ -5,79 +5,358 @@ keyframes/matcher.py - Module for matching keyframes with timestamps in a video
 import cv2
 import numpy as np
 import os
-import concurrent.futures
 import traceback
 import datetime
 from tqdm import tqdm
+from ..utils.decoder import open_video
+from .frame_store import FrameStore
+
+
+def normalize_frames(frames, size):
+    """
+    Downsample grayscale frames and normalize them for correlation.
+    
+    Each frame is resized to ``size`` (width, height) unless it was decoded
+    at that size, flattened, shifted to zero mean and scaled to unit norm, so
+    the dot product of two normalized frames is their Pearson correlation.
+    
+    Args:
+        frames: Sequence of 2D grayscale frames
+        size: (width, height) to downsample to
+        
+    Returns:
+        float32 array of shape (len(frames), width * height)
+    """
+    vectors = np.stack([frame if (frame.shape[1], frame.shape[0]) == size
+                        else cv2.resize(frame, size, interpolation=cv2.INTER_AREA) for frame in frames])
+    vectors = vectors.reshape(len(frames), -1).astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-8)
+    return vectors
+
 
 class VideoKeyframeMatcher:
-    def __init__(self, video_path, keyframes_folder):
+    def __init__(self, video_path, keyframes_folder, match_size=(96, 54), chunk_size=2048,
+                 coarse_fps=2.0, coarse_size=(64, 36), top_k=3, coarse_margin=0.02, decoder_kwargs=None):
         self.video_path = video_path
         self.keyframes_folder = keyframes_folder
         self.video_array = None
         self.fps = None
+        # Resolution frames are compared at and number of frames scored per matrix multiply
+        self.match_size = tuple(match_size)
+        self.chunk_size = max(1, int(chunk_size))
+        self.normalized_frames = None
+        # Coarse-to-fine search: sampling rate and resolution of the coarse pass,
+        # and which coarse candidates per keyframe are refined at full frame rate
+        self.coarse_fps = coarse_fps
+        self.coarse_size = tuple(coarse_size)
+        self.top_k = max(1, int(top_k))
+        self.coarse_margin = coarse_margin
+        # open_video() options (backend, threads, hw_accel)
+        self.decoder_kwargs = decoder_kwargs or {}
 
-    def load_video_to_array(self):
-        """Load the video into a 3D numpy array."""
+    def open_video(self, **kwargs):
+        """Open the video with the configured decoder, returning grayscale frames"""
+        return open_video(self.video_path, gray=True, **self.decoder_kwargs, **kwargs)
+
+    def load_video_to_array(self, store_path=None):
+        """
+        Load the video into a 3D numpy array of grayscale frames decoded at match_size.
+        
+        Args:
+            store_path: Optional FrameStore directory. When it holds this video
+                at match_size the frames are memory-mapped from it without
+                decoding; otherwise the video is decoded into it first.
+        """
         try:
-            cap = cv2.VideoCapture(self.video_path)
-            if not cap.isOpened():
-                raise Exception("Error opening video file")
-            
-            self.fps = cap.get(cv2.CAP_PROP_FPS)
-            frames = []
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            for _ in tqdm(range(total_frames), desc="Loading video frames"):
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                frames.append(gray_frame)
-            
-            cap.release()
-            self.video_array = np.stack(frames, axis=0)
+            store = FrameStore(store_path) if store_path else None
+            if store is not None and store.is_valid(self.video_path, self.match_size):
+                self.video_array, self.fps = store.open()
+                print(f"Opened frame store {store_path} ({len(self.video_array)} frames)")
+                return True
+
+            with self.open_video(size=self.match_size) as decoder:
+                self.fps = decoder.fps
+
+                def frames():
+                    for _ in tqdm(range(decoder.frame_count), desc="Loading video frames"):
+                        ret, gray_frame = decoder.read()
+                        if not ret:
+                            break
+                        yield gray_frame
+
+                if store is not None:
+                    # Frames go straight to disk, so building the store never holds the video in RAM
+                    store.build(frames(), self.video_path, self.fps, self.match_size)
+                    self.video_array, _ = store.open()
+                    print(f"Frame store saved to {store_path}")
+                else:
+                    self.video_array = np.stack(list(frames()), axis=0)
             return True
         except Exception as e:
             traceback.print_exc()
             print(f"Error loading video: {str(e)}")
             return False
 
-    def find_matching_frame(self, keyframe_path):
-        """Find the best matching frame for a given keyframe using cross-correlation."""
-        try:
+    def normalize_video(self):
+        """Normalize all loaded video frames once, in chunks, for vectorized matching."""
+        if self.normalized_frames is None:
+            chunks = []
+            for start in tqdm(range(0, len(self.video_array), self.chunk_size), desc="Normalizing frames", leave=False):
+                chunks.append(normalize_frames(self.video_array[start:start + self.chunk_size], self.match_size))
+            self.normalized_frames = np.concatenate(chunks, axis=0)
+        return self.normalized_frames
+
+    def load_keyframes(self, keyframe_paths):
+        """
+        Load keyframes as grayscale images, skipping the ones that cannot be read.
+        
+        Callers normalize them with normalize_frames() at the size they match at.
+        
+        Returns:
+            (paths, keyframes) for the keyframes that could be read
+        """
+        loaded_paths, keyframes = [], []
+        for keyframe_path in keyframe_paths:
             keyframe = cv2.imread(keyframe_path, cv2.IMREAD_GRAYSCALE)
             if keyframe is None:
-                raise Exception(f"Error loading keyframe: {keyframe_path}")
+                print(f"Error loading keyframe: {keyframe_path}")
+                continue
+            loaded_paths.append(keyframe_path)
+            keyframes.append(keyframe)
+        return loaded_paths, keyframes
+
+    def iter_normalized_chunks(self):
+        """
+        Yield (start_index, normalized_chunk) pairs covering the whole video.
+        
+        Uses the frames loaded by load_video_to_array when available (a frame
+        store is read chunk by chunk instead of being normalized at once); otherwise
+        the video is decoded in a single streaming pass at match_size and only
+        one chunk of chunk_size frames is held in memory at a time.
+        """
+        if isinstance(self.video_array, np.memmap):
+            # Stored frames are normalized chunk by chunk, so only the pages in use are read
+            for start in range(0, len(self.video_array), self.chunk_size):
+                yield start, normalize_frames(self.video_array[start:start + self.chunk_size], self.match_size)
+            return
+        if self.video_array is not None:
+            frames = self.normalize_video()
+            for start in range(0, len(frames), self.chunk_size):
+                yield start, frames[start:start + self.chunk_size]
+            return
 
-            # Calculate normalized cross-correlation and find the best match
-            best_frame_index = -1
-            max_corr = -np.inf
+        with self.open_video(size=self.match_size) as decoder:
+            self.fps = decoder.fps
+            start, chunk = 0, []
+            for _ in tqdm(range(decoder.frame_count), desc="Matching video frames"):
+                ret, frame = decoder.read()
+                if not ret:
+                    break
+                chunk.append(frame)
+                if len(chunk) == self.chunk_size:
+                    yield start, normalize_frames(chunk, self.match_size)
+                    start, chunk = start + len(chunk), []
+            if chunk:
+                yield start, normalize_frames(chunk, self.match_size)
+
+    def match_keyframes(self, keyframe_paths):
+        """
+        Find the best matching frame for several keyframes at once.
+        
+        All keyframes are scored against chunks of normalized video frames with
+        one matrix multiply per chunk, keeping only a running best match per
+        keyframe. If the video has not been loaded with load_video_to_array it
+        is streamed from disk in one pass instead of being held in memory.
+        
+        Args:
+            keyframe_paths: List of keyframe image paths
             
-            for i, frame in enumerate(tqdm(self.video_array, desc=f"Matching {os.path.basename(keyframe_path)}", leave=False)):
-                corr = np.corrcoef(frame.ravel(), keyframe.ravel())[0, 1]
-                if corr > max_corr:
-                    max_corr = corr
-                    best_frame_index = i
-
-            best_time = best_frame_index / self.fps
-            return keyframe_path, best_time, max_corr
+        Returns:
+            List of (keyframe_path, best_time, max_corr) tuples in input order;
+            time and correlation are -1 for keyframes that could not be matched
+        """
+        try:
+            loaded_paths, keyframes = self.load_keyframes(keyframe_paths)
+            best = {}
+            if loaded_paths:
+                keyframes = normalize_frames(keyframes, self.match_size)
+                best_index = np.full(len(loaded_paths), -1, dtype=np.int64)
+                best_corr = np.full(len(loaded_paths), -np.inf, dtype=np.float32)
+                for start, frames in self.iter_normalized_chunks():
+                    scores = frames @ keyframes.T
+                    chunk_best = scores.argmax(axis=0)
+                    chunk_corr = scores[chunk_best, np.arange(len(loaded_paths))]
+                    improved = chunk_corr > best_corr
+                    best_corr[improved] = chunk_corr[improved]
+                    best_index[improved] = chunk_best[improved] + start
+                for path, index, corr in zip(loaded_paths, best_index, best_corr):
+                    if index >= 0:
+                        best[path] = (path, index / self.fps, float(corr))
+            return [best.get(path, (path, -1, -1)) for path in keyframe_paths]
         except Exception as e:
             traceback.print_exc()
-            print(f"Error matching frame: {str(e)}")
-            return keyframe_path, -1, -1
+            print(f"Error matching keyframes: {str(e)}")
+            return [(path, -1, -1) for path in keyframe_paths]
+
+    def coarse_candidates(self, keyframes):
+        """
+        Coarse pass: score keyframes against a low-resolution, temporally
+        subsampled version of the video.
+        
+        Frames between samples are skipped with grab() so they are never
+        converted or copied, and samples are decoded straight at coarse_size. A keyframe's candidates are its top_k coarse
+        matches plus every sample scoring within coarse_margin of its best,
+        so near-static shots, which look alike at low resolution, are refined
+        as a whole.
+        
+        Args:
+            keyframes: Keyframes normalized at coarse_size, shape (K, D)
+            
+        Returns:
+            (candidates, step): a list with an array of candidate frame indices
+            per keyframe, and the sampling step in frames
+        """
+        with self.open_video(size=self.coarse_size) as decoder:
+            self.fps = decoder.fps
+            step = max(1, int(round(self.fps / self.coarse_fps)))
+
+            indices, chunk, scores = [], [], []
+            for index in tqdm(range(decoder.frame_count), desc="Coarse matching"):
+                if not decoder.grab():
+                    break
+                if index % step:
+                    continue
+                ret, frame = decoder.retrieve()
+                if not ret:
+                    continue
+                indices.append(index)
+                chunk.append(frame)
+                if len(chunk) == self.chunk_size:
+                    scores.append(normalize_frames(chunk, self.coarse_size) @ keyframes.T)
+                    chunk = []
+            if chunk:
+                scores.append(normalize_frames(chunk, self.coarse_size) @ keyframes.T)
+
+        if not scores:
+            return [np.array([], dtype=np.int64) for _ in keyframes], step
+        # Coarse scores are small (one row per sampled frame), so keep them all
+        indices = np.array(indices)
+        scores = np.concatenate(scores, axis=0)
+        candidates = []
+        for column in scores.T:
+            top = np.argsort(-column)[:self.top_k]
+            close = np.flatnonzero(column >= column.max() - self.coarse_margin)
+            candidates.append(indices[np.union1d(top, close)])
+        return candidates, step
+
+    def match_keyframes_coarse_to_fine(self, keyframe_paths):
+        """
+        Find the best matching frame for each keyframe with a coarse-to-fine search.
+        
+        A coarse pass at coarse_fps and coarse_size picks candidate frames per
+        keyframe; only a window of one coarse step around each candidate is
+        then decoded at full frame rate and full resolution to land on the
+        exact frame.
+        
+        Args:
+            keyframe_paths: List of keyframe image paths
+            
+        Returns:
+            List of (keyframe_path, best_time, max_corr) tuples in input order
+        """
+        try:
+            loaded_paths, keyframes = self.load_keyframes(keyframe_paths)
+            if not loaded_paths:
+                return [(path, -1, -1) for path in keyframe_paths]
+
+            candidates, step = self.coarse_candidates(normalize_frames(keyframes, self.coarse_size))
+
+            # Merge the refinement windows of all keyframes into disjoint frame ranges
+            windows = sorted((max(0, index - step), index + step)
+                             for keyframe_candidates in candidates for index in keyframe_candidates)
+            ranges = []
+            for low, high in windows:
+                if ranges and low <= ranges[-1][1] + 1:
+                    ranges[-1][1] = max(ranges[-1][1], high)
+                else:
+                    ranges.append([low, high])
+
+            with self.open_video() as decoder:
+                width, height = decoder.frame_size
+                full_keyframes = normalize_frames(keyframes, (width, height))
+                best_index = np.full(len(loaded_paths), -1, dtype=np.int64)
+                best_corr = np.full(len(loaded_paths), -np.inf, dtype=np.float32)
+
+                for low, high in tqdm(ranges, desc="Refining matches"):
+                    decoder.seek(low)
+                    for index in range(low, high + 1):
+                        ret, gray = decoder.read()
+                        if not ret:
+                            break
+                        scores = normalize_frames([gray], (width, height))[0] @ full_keyframes.T
+                        # Only keyframes whose candidates are near this frame may take it
+                        in_window = np.array([bool(np.any(np.abs(keyframe_candidates - index) <= step))
+                                              for keyframe_candidates in candidates])
+                        improved = in_window & (scores > best_corr)
+                        best_corr[improved] = scores[improved]
+                        best_index[improved] = index
+
+            best = {path: (path, index / self.fps, float(corr))
+                    for path, index, corr in zip(loaded_paths, best_index, best_corr) if index >= 0}
+            return [best.get(path, (path, -1, -1)) for path in keyframe_paths]
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error matching keyframes: {str(e)}")
+            return [(path, -1, -1) for path in keyframe_paths]
+
+    def match_keyframes_index(self, keyframe_paths, index):
+        """
+        Look up the best matching frame for each keyframe in a VideoIndex, without decoding the video.
+        
+        Args:
+            keyframe_paths: List of keyframe image paths
+            index: Opened VideoIndex of this video
+            
+        Returns:
+            List of (keyframe_path, best_time, max_corr) tuples in input order
+        """
+        try:
+            self.fps = index.fps
+            best = {}
+            for keyframe_path, keyframe in zip(*self.load_keyframes(keyframe_paths)):
+                frame_index, corr = index.lookup(keyframe)
+                if frame_index >= 0:
+                    best[keyframe_path] = (keyframe_path, frame_index / self.fps, corr)
+            return [best.get(path, (path, -1, -1)) for path in keyframe_paths]
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error matching keyframes: {str(e)}")
+            return [(path, -1, -1) for path in keyframe_paths]
+
+    def find_matching_frame(self, keyframe_path):
+        """Find the best matching frame for a given keyframe using cross-correlation."""
+        return self.match_keyframes([keyframe_path])[0]
 
-    def process_keyframes(self):
-        """Process keyframes in parallel and find the best matching time stamps."""
+    def process_keyframes(self, coarse_to_fine=False, index=None):
+        """
+        Match all keyframes in one vectorized pass and find the best matching time stamps.
+        
+        Args:
+            coarse_to_fine: Use the coarse-to-fine search instead of scoring every frame
+            index: Opened VideoIndex to look the keyframes up in instead of decoding the video
+        """
         try:
             keyframe_files = sorted([f for f in os.listdir(self.keyframes_folder) if not f.startswith(".") and f.endswith('.jpeg')])
             keyframe_paths = [os.path.join(self.keyframes_folder, kf) for kf in keyframe_files]
 
-            results = []
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = list(executor.map(self.find_matching_frame, keyframe_paths))
-                for result in futures:
-                    results.append(result)
+            if index is not None:
+                results = self.match_keyframes_index(keyframe_paths, index)
+            elif coarse_to_fine:
+                results = self.match_keyframes_coarse_to_fine(keyframe_paths)
+            else:
+                results = self.match_keyframes(keyframe_paths)
 
             # Sort results by time and print
             results.sort(key=lambda x: x[1])  # Sort by timestamp
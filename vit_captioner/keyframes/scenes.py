@@ -0,0 +1,242 @@
+"""
+keyframes/scenes.py - Native keyframe selection with OpenCV scene scoring
+"""
+
+import heapq
+import cv2
+import numpy as np
+from tqdm import tqdm
+from ..utils.decoder import open_video
+
+HISTOGRAM = "histogram"
+DIFFERENCE = "difference"
+METHODS = (HISTOGRAM, DIFFERENCE)
+
+
+def frame_signature(frame, method=HISTOGRAM, analysis_width=160):
+    """
+    Compute a cheap per-frame signature used to detect content changes.
+
+    Args:
+        frame: BGR frame
+        method: "histogram" for a normalized HSV colour histogram, or
+            "difference" for a small grayscale thumbnail
+        analysis_width: Width the frame is downsampled to before analysis
+
+    Returns:
+        Signature as a float32 numpy array
+    """
+    height, width = frame.shape[:2]
+    if width > analysis_width:
+        size = (analysis_width, max(1, int(round(height * analysis_width / width))))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    if method == HISTOGRAM:
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1, 2], None, [8, 4, 4], [0, 180, 0, 256, 0, 256])
+        return cv2.normalize(hist, hist).flatten()
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255.0
+
+
+def signature_distance(previous, current, method=HISTOGRAM):
+    """Distance between two frame signatures, in [0, 1]; higher means a bigger content change"""
+    if method == HISTOGRAM:
+        return float(cv2.compareHist(previous, current, cv2.HISTCMP_BHATTACHARYYA))
+    return float(np.mean(np.abs(previous - current)))
+
+
+def select_keyframes(video_path, num_key_frames, method=HISTOGRAM, analysis_fps=None,
+                     analysis_width=160, verbose=False, decoder_kwargs=None):
+    """
+    Select keyframes in a single streaming pass over the video.
+
+    Every analysed frame is scored by how much it differs from the previous
+    one; the strongest content changes become keyframes, with the first
+    frame always included. Only a bounded number of candidate frames is held
+    in memory. Candidates closer than a minimum gap to a stronger one are
+    dropped, and if the video has too few changes the remaining slots are
+    filled with evenly spaced frames.
+
+    Args:
+        video_path: Path to the video file
+        num_key_frames: Number of keyframes to select
+        method: Scene scoring method, "histogram" or "difference"
+        analysis_fps: Analyse this many frames per second (every frame when None);
+            skipped frames are grabbed but not retrieved
+        analysis_width: Width frames are downsampled to for scoring
+        verbose: Show a progress bar
+        decoder_kwargs: open_video() options (backend, threads, hw_accel)
+
+    Returns:
+        List of (frame, timestamp, score) tuples sorted by timestamp, where
+        frame is the BGR frame at the decoder's output size (the source
+        resolution by default) and timestamp is in seconds
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown scene scoring method: {method} (expected one of {', '.join(METHODS)})")
+    num_key_frames = max(1, int(num_key_frames))
+
+    decoder = open_video(video_path, **(decoder_kwargs or {}))
+    try:
+        fps = decoder.fps
+        total_frames = decoder.frame_count
+        duration = total_frames / fps if fps else 0
+        step = max(1, int(round(fps / analysis_fps))) if analysis_fps else 1
+        # Suppress candidates closer than this to a stronger one
+        min_gap = max(0.5, duration / (num_key_frames * 4)) if duration else 0.5
+
+        # Bounded min-heap of the strongest changes seen so far
+        capacity = num_key_frames * 4
+        candidates = []
+        # Evenly spaced fallback frames for videos with few content changes
+        fallback_indices = set(int(i * total_frames / num_key_frames) // step * step for i in range(num_key_frames))
+        fallback = []
+
+        previous = None
+        for index in tqdm(range(total_frames), desc="Scoring frames", disable=not verbose):
+            if not decoder.grab():
+                break
+            if index % step:
+                continue
+            ret, frame = decoder.retrieve()
+            if not ret:
+                continue
+            signature = frame_signature(frame, method, analysis_width)
+            score = np.inf if previous is None else signature_distance(previous, signature, method)
+            previous = signature
+            timestamp = index / fps if fps else 0.0
+
+            item = (score, index, timestamp, frame)
+            if len(candidates) < capacity:
+                heapq.heappush(candidates, item)
+            elif score > candidates[0][0]:
+                heapq.heapreplace(candidates, item)
+            if index in fallback_indices:
+                fallback.append((frame, timestamp, score))
+    finally:
+        decoder.release()
+
+    selected = []
+    for score, _, timestamp, frame in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        if len(selected) == num_key_frames:
+            break
+        if score <= 0:
+            break
+        if all(abs(timestamp - t) >= min_gap for _, t, _ in selected):
+            selected.append((frame, timestamp, score))
+
+    # Fill remaining slots with the fallback frames farthest from the selection
+    remaining = [f for f in fallback if all(f[1] != t for _, t, _ in selected)]
+    while len(selected) < num_key_frames and remaining:
+        farthest = max(remaining, key=lambda f: min((abs(f[1] - t) for _, t, _ in selected), default=np.inf))
+        remaining.remove(farthest)
+        selected.append(farthest)
+
+    return sorted(selected, key=lambda f: f[1])
+
+
+def keyframe_intervals(keyframes, duration):
+    """
+    Turn keyframe timestamps into caption intervals.
+
+    Each keyframe covers the time from its timestamp to the next keyframe's
+    timestamp; the first starts at 0 and the last ends at the video duration.
+
+    Args:
+        keyframes: List of (frame, timestamp, ...) tuples sorted by timestamp
+        duration: Video duration in seconds
+
+    Returns:
+        List of (frame, start_time, end_time) tuples
+    """
+    intervals = []
+    for i, keyframe in enumerate(keyframes):
+        start = 0.0 if i == 0 else keyframe[1]
+        end = keyframes[i + 1][1] if i + 1 < len(keyframes) else max(duration, keyframe[1])
+        intervals.append((keyframe[0], start, end))
+    return intervals
+
+
+
+def iter_shots(video_path, method=HISTOGRAM, min_score=0.02, ratio=3.0, window=15,
+               min_shot_length=0.5, analysis_fps=None, analysis_width=160, verbose=False, decoder_kwargs=None):
+    """
+    Detect shots while decoding and yield one representative frame per shot.
+
+    A shot boundary is placed where the change from the previous frame is
+    at least min_score and ratio times the average change over the last
+    window frames, so both hard cuts and busy shots with lots of motion are
+    handled. Boundaries closer than min_shot_length seconds to the previous
+    one are ignored, and a last shot shorter than min_shot_length is merged
+    into the one before it. The representative frame of a shot is its most
+    stable frame (the one that changed least from its predecessor). Each
+    shot is yielded once the shot after it has ended, holding at most two
+    frames in memory.
+
+    Args:
+        video_path: Path to the video file
+        method: Scene scoring method, "histogram" or "difference"
+        min_score: Minimum change for a boundary
+        ratio: How far above the recent average change a boundary must be
+        window: Number of recent frames the average change is taken over
+        min_shot_length: Minimum shot length in seconds
+        analysis_fps: Analyse this many frames per second (every frame when None)
+        analysis_width: Width frames are downsampled to for scoring
+        verbose: Show a progress bar
+        decoder_kwargs: open_video() options (backend, threads, hw_accel)
+
+    Yields:
+        (frame, start_time, end_time) tuples with BGR frames at the decoder's output size
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown scene scoring method: {method} (expected one of {', '.join(METHODS)})")
+
+    decoder = open_video(video_path, **(decoder_kwargs or {}))
+    try:
+        fps = decoder.fps
+        total_frames = decoder.frame_count
+        step = max(1, int(round(fps / analysis_fps))) if analysis_fps else 1
+
+        previous = None
+        recent = []
+        shot_start, best_frame, best_score = 0.0, None, np.inf
+        # Ended shot held back until the next one ends, so a too-short final shot can extend it
+        pending = None
+        for index in tqdm(range(total_frames), desc="Detecting shots", disable=not verbose):
+            if not decoder.grab():
+                break
+            if index % step:
+                continue
+            ret, frame = decoder.retrieve()
+            if not ret:
+                continue
+            timestamp = index / fps if fps else 0.0
+            signature = frame_signature(frame, method, analysis_width)
+            score = np.inf if previous is None else signature_distance(previous, signature, method)
+            previous = signature
+
+            if best_frame is not None and score >= min_score and timestamp - shot_start >= min_shot_length \
+                    and (not recent or score >= ratio * np.mean(recent)):
+                if pending is not None:
+                    yield pending
+                pending = (best_frame, shot_start, timestamp)
+                shot_start, best_frame, best_score = timestamp, None, np.inf
+                recent = []
+            elif np.isfinite(score):
+                recent = (recent + [score])[-window:]
+
+            # The first frame of a shot is only kept until a steadier one comes along
+            if best_frame is None or score < best_score:
+                best_frame, best_score = frame, score
+        if best_frame is not None:
+            end_time = max(total_frames / fps if fps else 0.0, shot_start)
+            if pending is not None and end_time - shot_start < min_shot_length:
+                # The tail is too short to be a shot of its own
+                pending = (pending[0], pending[1], end_time)
+            else:
+                if pending is not None:
+                    yield pending
+                pending = (best_frame, shot_start, end_time)
+        if pending is not None:
+            yield pending
+    finally:
+        decoder.release()
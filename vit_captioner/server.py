@@ -0,0 +1,245 @@
+"""
+server.py - Local HTTP captioning service with a resident model and dynamic batching
+"""
+
+import io
+import os
+import json
+import base64
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+from .captioning.base import create_captioner
+from .captioning.video import VideoToCaption, DEFAULT_FRAME_SIZE
+from .captioning.constants import FP32, BEAM, DEFAULT_CONFIDENCE_THRESHOLD
+from .captioning.render import flush_writes
+from .captioning.batcher import DynamicBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from .keyframes.extractor import BACKENDS, NATIVE
+from .utils.sampling import STRATEGIES, AUTO
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+# Request fields forwarded to VideoToCaption, with their types
+VIDEO_OPTIONS = {
+    "num_frames": int,
+    "interval": float,
+    "batch_size": int,
+    "sampling": str,
+    "keyframe_backend": str,
+    "dedup": int,
+    "frame_size": int,
+}
+
+
+class BadRequest(Exception):
+    """Raised for malformed requests, answered with HTTP 400"""
+
+
+class NotFound(Exception):
+    """Raised for missing input files, answered with HTTP 404"""
+
+
+class CaptionRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler for the captioning service.
+
+    Endpoints:
+        GET  /health         Model and batching status
+        POST /caption-image  JSON {"image_path": ...} or {"image": <base64>},
+                             or a raw image body; returns {"caption": ...}
+        POST /caption-video  JSON {"video_path": ..., "num_frames": ..., "interval": ...,
+                             "shots": ..., "dedup": ..., "frame_size": ...}; returns the SRT/JSON paths and cues
+    """
+
+    # Set by CaptionServer
+    batcher = None
+    verbose = False
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            captioner = self.batcher.captioner
+            self.send_json(200, {
+                "status": "ok",
+                "model": captioner.model_name,
+                "device": str(captioner.device),
+                "precision": captioner.precision,
+                "decoding": captioner.decoding,
+                "pending": self.batcher.pending(),
+                "batches": self.batcher.batches,
+                "requests": self.batcher.requests,
+            })
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        routes = {"/caption-image": self.caption_image, "/caption-video": self.caption_video}
+        route = routes.get(self.path.rstrip("/"))
+        if route is None:
+            self.send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+        try:
+            self.send_json(200, route())
+        except BadRequest as e:
+            self.send_json(400, {"error": str(e)})
+        except NotFound as e:
+            self.send_json(404, {"error": str(e)})
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error handling {self.path}: {str(e)}")
+            self.send_json(500, {"error": str(e)})
+
+    def read_body(self):
+        """Read the raw request body"""
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def read_json(self, body):
+        """Parse a JSON object request body"""
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise BadRequest(f"Invalid JSON body: {str(e)}")
+        if not isinstance(payload, dict):
+            raise BadRequest("Request body must be a JSON object")
+        return payload
+
+    def caption_image(self):
+        """Caption one image; concurrent requests share generate calls"""
+        body = self.read_body()
+        if self.headers.get("Content-Type", "").startswith("image/"):
+            image, save_path = self.decode_image(body), None
+        else:
+            payload = self.read_json(body)
+            if "image" in payload:
+                try:
+                    image = self.decode_image(base64.b64decode(payload["image"]))
+                except ValueError as e:
+                    raise BadRequest(f"Invalid base64 image: {str(e)}")
+                save_path = None
+            elif "image_path" in payload:
+                image_path = payload["image_path"]
+                image = self.load_image(image_path)
+                save_path = image_path if payload.get("save_image") else None
+            else:
+                raise BadRequest("Expected 'image_path' or base64 'image'")
+        return {"caption": self.batcher.submit(image, save_path).result()}
+
+    def load_image(self, image_path):
+        """Load an image file into an RGB PIL Image, before it is queued with other requests"""
+        if not isinstance(image_path, str) or not image_path:
+            raise BadRequest("'image_path' must be a non-empty string")
+        if not os.path.isfile(image_path):
+            raise NotFound(f"Image not found: {image_path}")
+        try:
+            with Image.open(image_path) as img:
+                return img.convert("RGB")
+        except Exception as e:
+            raise BadRequest(f"Could not read image {image_path}: {str(e)}")
+
+    def decode_image(self, data):
+        """Decode image bytes into an RGB PIL Image"""
+        try:
+            return Image.open(io.BytesIO(data)).convert("RGB")
+        except Exception as e:
+            raise BadRequest(f"Could not decode image: {str(e)}")
+
+    def caption_video(self):
+        """Caption a video; its frames are batched together with other requests"""
+        payload = self.read_json(self.read_body())
+        if "video_path" not in payload:
+            raise BadRequest("Expected 'video_path'")
+        video_path = payload["video_path"]
+        if not isinstance(video_path, str) or not video_path:
+            raise BadRequest("'video_path' must be a non-empty string")
+        if not os.path.isfile(video_path):
+            raise NotFound(f"Video not found: {video_path}")
+        try:
+            options = {name: cast(payload[name]) for name, cast in VIDEO_OPTIONS.items()
+                       if payload.get(name) is not None}
+        except (TypeError, ValueError) as e:
+            raise BadRequest(f"Invalid video option: {str(e)}")
+        if "interval" in options and (options["interval"] <= 0 or payload.get("shots")):
+            raise BadRequest("'interval' must be positive and cannot be combined with 'shots'")
+        if options.get("sampling", AUTO) not in STRATEGIES:
+            raise BadRequest(f"Unknown 'sampling': {options['sampling']} (expected one of {', '.join(STRATEGIES)})")
+        if options.get("keyframe_backend", NATIVE) not in BACKENDS:
+            raise BadRequest(f"Unknown 'keyframe_backend': {options['keyframe_backend']} "
+                             f"(expected one of {', '.join(BACKENDS)})")
+
+        converter = VideoToCaption(video_path, num_frames=options.get("num_frames", 10),
+                                   verbose=self.verbose, batch_size=options.get("batch_size", 8),
+                                   frame_interval=options.get("interval"),
+                                   sampling=options.get("sampling", AUTO),
+                                   keyframe_backend=options.get("keyframe_backend", NATIVE),
+                                   segmentation="shots" if payload.get("shots") else "keyframes",
+                                   dedup_threshold=options.get("dedup"), captioner=self.batcher,
+                                   frame_size=options.get("frame_size", DEFAULT_FRAME_SIZE) or None)
+        if not converter.convert():
+            raise Exception(f"Could not caption video {video_path}")
+        return {
+            "srt": converter.output_srt,
+            "json": converter.output_json,
+            "captions": [{"start": e['start'], "end": e['end'], "text": e['text']}
+                         for e in converter.srt_entries],
+        }
+
+    def send_json(self, status, payload):
+        """Send a JSON response"""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+class CaptionServer:
+    """
+    Keep an ImageCaptioner resident and serve captions over HTTP.
+
+    Every request is handled on its own thread and the captions it needs are
+    queued on a DynamicBatcher, so concurrent image requests and video frames
+    are captioned together in batched generate calls.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, captioner=None, cache=None, precision=FP32, onnx_dir=None,
+                 decoding=BEAM, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD, encoder_cache=None, verbose=False):
+        self.captioner = captioner or create_captioner(cache=cache, precision=precision, onnx_dir=onnx_dir,
+                                                       decoding=decoding, confidence_threshold=confidence_threshold,
+                                                       encoder_cache=encoder_cache)
+        self.batcher = DynamicBatcher(self.captioner, max_batch_size, max_wait_ms)
+        handler = type("Handler", (CaptionRequestHandler,), {"batcher": self.batcher, "verbose": verbose})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def address(self):
+        """(host, port) the server is listening on"""
+        return self.httpd.server_address[:2]
+
+    def serve_forever(self):
+        """Serve requests until interrupted"""
+        host, port = self.address
+        print(f"Serving captions on http://{host}:{port} (model: {self.captioner.model_name})")
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("Shutting down")
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop serve_forever() from another thread"""
+        self.httpd.shutdown()
+
+    def close(self):
+        """Close the socket, stop the batcher and write the queued captioned images"""
+        self.httpd.server_close()
+        self.batcher.close()
+        flush_writes()
@@ -2,6 +2,19 @@
 Utility functions for visualization and other tasks
 """
 
-from .visualization import visualize_keyframes, visualize_timeline
+from .lazy import lazy_exports
 
-__all__ = ['visualize_keyframes', 'visualize_timeline']
\ No newline at end of file
+_EXPORTS = {
+    'visualize_keyframes': '.visualization',
+    'visualize_timeline': '.visualization',
+    'FrameSampler': '.sampling',
+    'open_video': '.decoder',
+    'probe_duration': '.decoder',
+    'dhash': '.image_hash',
+    'hamming_distances': '.image_hash',
+}
+
+__all__ = list(_EXPORTS)
+
+# Exports are imported on first access so importing the package stays cheap
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,243 @@
+"""
+utils/decoder.py - Pluggable video decoders with threaded decoding and downscaled or gray output
+"""
+
+import cv2
+
+OPENCV = "opencv"
+PYAV = "pyav"
+BACKENDS = (OPENCV, PYAV)
+
+
+def open_video(video_path, backend=OPENCV, size=None, gray=False, rgb=False, threads=None, hw_accel=False):
+    """
+    Open a video for decoding.
+
+    Args:
+        video_path: Path to the video file
+        backend: "opencv" (cv2.VideoCapture) or "pyav" (requires the av package)
+        size: (width, height) to output frames at, an int to scale the shorter
+            side down to that many pixels keeping the aspect ratio, or None
+            for the source size
+        gray: Output 2D grayscale frames instead of BGR
+        rgb: Output RGB frames instead of BGR
+        threads: Decoder threads (None lets the backend decide)
+        hw_accel: Ask OpenCV's FFmpeg backend for hardware-accelerated decoding
+
+    Returns:
+        An opened VideoDecoder; raises an Exception if the file cannot be opened
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown decoder backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    if backend == PYAV:
+        return PyAVDecoder(video_path, size=size, gray=gray, rgb=rgb, threads=threads)
+    return OpenCVDecoder(video_path, size=size, gray=gray, rgb=rgb, threads=threads, hw_accel=hw_accel)
+
+
+def probe_duration(video_path, **decoder_kwargs):
+    """Read the video duration in seconds from its metadata"""
+    with open_video(video_path, **decoder_kwargs) as decoder:
+        return decoder.duration
+
+
+class VideoDecoder:
+    """
+    Frame-by-frame video decoder with a cv2.VideoCapture-like interface.
+
+    ``grab()`` decodes the next frame without converting it, ``retrieve()``
+    converts the last grabbed frame and ``read()`` does both. Converted
+    frames are resized to ``size`` with INTER_AREA first, so the colour
+    conversion only touches the small frame, and are BGR, RGB with ``rgb``
+    or 2D grayscale with ``gray``. ``position`` is the index of the next
+    frame ``grab()`` returns.
+
+    Backends set fps, frame_count, source_size and implement _grab(),
+    _retrieve() and _seek().
+    """
+
+    def __init__(self, size=None, gray=False, rgb=False):
+        self.size = size if isinstance(size, int) or not size else tuple(size)
+        self.gray = gray
+        self.rgb = rgb
+        self.position = 0
+        self.fps = 0.0
+        self.frame_count = 0
+        self.source_size = (0, 0)
+
+    @property
+    def duration(self):
+        """Duration in seconds from the frame count and frame rate"""
+        return self.frame_count / self.fps if self.fps else 0.0
+
+    @property
+    def frame_size(self):
+        """(width, height) of the frames returned by retrieve()"""
+        if not self.size:
+            return self.source_size
+        if not isinstance(self.size, int):
+            return self.size
+        # Scale the shorter side down to size pixels; frames are never upscaled
+        width, height = self.source_size
+        scale = min(1.0, self.size / max(1, min(width, height)))
+        return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+    def grab(self):
+        """Decode the next frame without converting it"""
+        if not self._grab():
+            return False
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        """Convert the last grabbed frame, returning (ret, frame)"""
+        return self._retrieve()
+
+    def read(self):
+        """Decode and convert the next frame, returning (ret, frame)"""
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def seek(self, index):
+        """Make the frame at index the next one grab() returns"""
+        self._seek(int(index))
+        self.position = int(index)
+
+    def convert(self, frame):
+        """Resize a decoded BGR frame to the output size, then convert it to gray or RGB if requested"""
+        size = self.frame_size
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if self.gray:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        elif self.rgb:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return frame
+
+    def release(self):
+        """Close the video"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+
+
+class OpenCVDecoder(VideoDecoder):
+    """VideoDecoder backed by cv2.VideoCapture, with a decoder thread count and optional hardware acceleration"""
+
+    def __init__(self, video_path, size=None, gray=False, rgb=False, threads=None, hw_accel=False):
+        super().__init__(size, gray, rgb)
+        # Open parameters are only understood by OpenCV's FFmpeg backend; others ignore them
+        params = []
+        if threads:
+            params += [cv2.CAP_PROP_N_THREADS, int(threads)]
+        if hw_accel:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        self.cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, params) if params else cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise Exception("Error opening video file")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.source_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def _grab(self):
+        return self.cap.grab()
+
+    def _retrieve(self):
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            return False, None
+        return True, self.convert(frame)
+
+    def _seek(self, index):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVDecoder(VideoDecoder):
+    """
+    VideoDecoder backed by PyAV (FFmpeg) with frame- and slice-threaded decoding.
+
+    Frames are scaled and converted by FFmpeg's swscale in one step, straight
+    to the output size and to BGR, RGB or gray, so no full-size copy is made.
+    """
+
+    def __init__(self, video_path, size=None, gray=False, rgb=False, threads=None):
+        super().__init__(size, gray, rgb)
+        try:
+            import av
+        except ImportError:
+            raise ImportError("The pyav decoder requires PyAV. Install it with: pip install vit-captioner[pyav]")
+        try:
+            self.container = av.open(video_path)
+            self.stream = self.container.streams.video[0]
+        except Exception as e:
+            raise Exception(f"Error opening video file: {str(e)}")
+        self.stream.thread_type = "AUTO"
+        if threads:
+            self.stream.codec_context.thread_count = int(threads)
+
+        self.fps = float(self.stream.average_rate or self.stream.guessed_rate or 0)
+        self.frame_count = self.stream.frames
+        if not self.frame_count and self.fps:
+            if self.stream.duration:
+                seconds = float(self.stream.duration * self.stream.time_base)
+            else:
+                seconds = (self.container.duration or 0) / av.time_base
+            self.frame_count = int(round(seconds * self.fps))
+        self.source_size = (self.stream.codec_context.width, self.stream.codec_context.height)
+        self.start_pts = self.stream.start_time or 0
+        self.frames = self.container.decode(self.stream)
+        self.frame = None
+        # Frame decoded while seeking, returned by the next grab()
+        self.pending = None
+
+    def frame_index(self, frame):
+        """Index of a decoded frame, from its presentation timestamp"""
+        if frame.pts is None:
+            return self.position
+        return int(round(float((frame.pts - self.start_pts) * self.stream.time_base) * self.fps))
+
+    def _grab(self):
+        if self.pending is not None:
+            self.frame, self.pending = self.pending, None
+            return True
+        try:
+            self.frame = next(self.frames)
+            return True
+        except Exception:
+            # End of stream, or a decode error, which OpenCV's grab() also reports as False
+            self.frame = None
+            return False
+
+    def pixel_format(self):
+        """swscale output format of the converted frames"""
+        if self.gray:
+            return "gray"
+        return "rgb24" if self.rgb else "bgr24"
+
+    def _retrieve(self):
+        if self.frame is None:
+            return False, None
+        width, height = self.frame_size
+        frame = self.frame.reformat(width=width, height=height, format=self.pixel_format(),
+                                    interpolation="AREA")
+        return True, frame.to_ndarray()
+
+    def _seek(self, index):
+        # Seek to the keyframe at or before the target, then decode forward to it
+        timestamp = self.start_pts + int(index / self.fps / self.stream.time_base) if self.fps else self.start_pts
+        self.container.seek(timestamp, stream=self.stream, backward=True)
+        self.frames = self.container.decode(self.stream)
+        self.frame, self.pending = None, None
+        for frame in self.frames:
+            if self.frame_index(frame) >= index:
+                self.pending = frame
+                break
+
+    def release(self):
+        self.container.close()
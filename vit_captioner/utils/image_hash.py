@@ -0,0 +1,60 @@
+"""
+utils/image_hash.py - Difference hashes of images and thumbnails, and Hamming distances between them
+"""
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def load_pil(image):
+    """Open a path, PIL Image or RGB numpy array as a PIL Image"""
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    if not isinstance(image, Image.Image):
+        return Image.open(image)
+    return image
+
+
+def dhash(image, hash_size=8):
+    """
+    Compute a 64-bit difference hash of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and each bit records whether a pixel is brighter than its right-hand
+    neighbour, so visually similar frames get hashes a few bits apart.
+
+    Args:
+        image: Path to an image file, a PIL Image or an RGB numpy array
+        hash_size: Hash side length (hash_size * hash_size bits)
+
+    Returns:
+        Hash as a numpy uint64
+    """
+    pixels = np.asarray(load_pil(image).convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return np.packbits(bits).view(">u8")[0].astype(np.uint64)
+
+
+def thumbnail_hashes(thumbnails):
+    """
+    Compute 64-bit difference hashes of grayscale thumbnails.
+
+    Each thumbnail is reduced to 9x8 pixels and each bit records whether a
+    pixel is brighter than its right-hand neighbour, like dhash().
+
+    Returns:
+        uint64 array with one hash per thumbnail
+    """
+    if not len(thumbnails):
+        return np.zeros(0, dtype=np.uint64)
+    small = np.stack([cv2.resize(thumbnail, (9, 8), interpolation=cv2.INTER_AREA) for thumbnail in thumbnails])
+    small = small.astype(np.int16)
+    bits = (small[:, :, 1:] > small[:, :, :-1]).reshape(len(small), 64)
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def hamming_distances(hashes, value):
+    """Number of differing bits between every hash in a uint64 array and a single hash"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8)).reshape(len(hashes), 64).sum(axis=1)
@@ -0,0 +1,33 @@
+"""
+utils/lazy.py - Lazy package exports, so importing a package does not load its heavy modules
+"""
+
+import sys
+import importlib
+
+
+def lazy_exports(package_name, exports):
+    """
+    Build the module-level __getattr__ and __dir__ of a package with lazy exports.
+
+    An export is imported from its module on first access and then stored on
+    the package, so later lookups are plain attribute reads.
+
+    Args:
+        package_name: __name__ of the package
+        exports: Dictionary mapping each exported name to the relative module defining it
+
+    Returns:
+        (__getattr__, __dir__) to assign in the package
+    """
+    def __getattr__(name):
+        if name in exports:
+            value = getattr(importlib.import_module(exports[name], package_name), name)
+            setattr(sys.modules[package_name], name, value)
+            return value
+        raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package_name])) | set(exports))
+
+    return __getattr__, __dir__
@@ -0,0 +1,99 @@
+"""
+utils/sampling.py - Frame sampling strategies for reading selected frames from a video
+"""
+
+SEQUENTIAL = "sequential"
+SEEK = "seek"
+AUTO = "auto"
+STRATEGIES = (AUTO, SEQUENTIAL, SEEK)
+
+# Frames between samples above which seeking beats decoding forward. Seeking
+# restarts decoding at the previous keyframe, so it only pays off when the
+# jump is longer than a typical GOP.
+DEFAULT_SEEK_THRESHOLD = 120
+
+
+class FrameSampler:
+    """
+    Read a sorted set of frame indices from a VideoDecoder.
+
+    Two strategies are available:
+
+    - ``sequential``: walk the stream once, skipping unwanted frames with
+      ``grab()`` so they are decoded but never converted or copied.
+    - ``seek``: jump with ``seek()`` when the next sample is more
+      than ``seek_threshold`` frames ahead, and ``grab()`` forward otherwise,
+      so a seek never re-decodes the GOP it is already in.
+
+    ``auto`` picks ``sequential`` when the average gap between samples is
+    within ``seek_threshold`` frames and ``seek`` for sparse samples. The
+    strategy used, and the number of seeks and skipped frames, are available
+    on the sampler after sampling starts.
+    """
+
+    def __init__(self, decoder, strategy=AUTO, seek_threshold=DEFAULT_SEEK_THRESHOLD):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy: {strategy} (expected one of {', '.join(STRATEGIES)})")
+        self.decoder = decoder
+        self.requested_strategy = strategy
+        self.seek_threshold = max(1, int(seek_threshold))
+        self.strategy = None
+        self.seeks = 0
+        self.grabs = 0
+
+    def choose_strategy(self, frame_indices):
+        """Choose a strategy for the given sorted frame indices based on sample density"""
+        if self.requested_strategy != AUTO:
+            return self.requested_strategy
+        if len(frame_indices) < 2:
+            return SEEK if frame_indices and frame_indices[0] > self.seek_threshold else SEQUENTIAL
+        mean_gap = (frame_indices[-1] - frame_indices[0]) / (len(frame_indices) - 1)
+        return SEQUENTIAL if mean_gap <= self.seek_threshold else SEEK
+
+    def sample(self, frame_indices):
+        """
+        Decode the requested frames.
+
+        Args:
+            frame_indices: Frame indices to read (sorted, duplicates allowed)
+
+        Yields:
+            (frame_index, frame) for every index that could be decoded
+        """
+        frame_indices = sorted(int(index) for index in frame_indices)
+        self.strategy = self.choose_strategy(frame_indices)
+        position = self.decoder.position
+        last_index, last_frame = None, None
+        # Set after a failed decode, when the decoder's position is no longer known
+        lost = False
+
+        for target in frame_indices:
+            if target == last_index:
+                yield target, last_frame
+                continue
+            jump = target - position
+            if lost or jump < 0 or (self.strategy == SEEK and jump > self.seek_threshold):
+                self.decoder.seek(target)
+                self.seeks += 1
+                position, lost = target, False
+            while position < target:
+                if not self.decoder.grab():
+                    # A frame on the way could not be decoded; seek past it to the target
+                    self.decoder.seek(target)
+                    self.seeks += 1
+                    position = target
+                    break
+                self.grabs += 1
+                position += 1
+            ret, frame = self.decoder.read()
+            if not ret:
+                # Skip only this sample; the next one is reached by seeking
+                lost = True
+                continue
+            position += 1
+            last_index, last_frame = target, frame
+            yield target, frame
+
+    def describe(self):
+        """Short human-readable summary of how frames were sampled"""
+        return f"{self.strategy} sampling ({self.seeks} seeks, {self.grabs} frames skipped with grab)"
@@ -2,7 +2,6 @@
 utils/visualization.py - Module for visualization utilities
 """
 
-import matplotlib.pyplot as plt
 import os
 import traceback
 import datetime
@@ -23,6 +22,7 @@ def visualize_keyframes(keyframes_folder, captions=None, save_path=None):
     """
     try:
         import cv2
+        import matplotlib.pyplot as plt
         from matplotlib.gridspec import GridSpec
         
         # List all keyframes in the folder
@@ -94,6 +94,8 @@ def visualize_timeline(timestamps, captions, video_duration, save_path=None):
         Path to the saved visualization
     """
     try:
+        import matplotlib.pyplot as plt
+        
         plt.figure(figsize=(15, 5))
         
         # Create the timeline